@@ -0,0 +1,97 @@
+"""
+Commander catch-up after downtime: a synthetic backlog (hours of owner
+commands plus foreign chatter) is served by a localhost Bot API, then
+drained, coalesced and dispatched by the commander's boot pass.
+Reports the pass time and how many commands would run before/after
+coalescing, and checks that the persisted offset makes a restart a no-op.
+
+    python bench/bench_backlog.py
+    python bench/bench_backlog.py --updates 2000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+DATA_DIR = common.setup_paths()
+
+import commander
+import transport as transport_module
+from backlog import OffsetStore, OFFSET_FILE_NAME
+
+OWNER = 1
+MIX = ["/capture"] * 5 + ["/stat", "/stat 1h", "/locate", "/screen", "/ping", "/lock", "/msg hello"]
+
+def make_backlog(n, hours, seed=1):
+    """n updates spread over the last `hours`, oldest first"""
+    rng = random.Random(seed)
+    now = time.time()
+    updates = []
+    for i in range(n):
+        sent_at = int(now - 600 - hours * 3600 * (1 - i / n))  # Laptop off until 10 min ago
+        sender = OWNER if rng.random() < 0.9 else 4242  # Someone else messaging the bot
+        updates.append({"update_id": 1000 + i, "message": {
+            "date": sent_at, "from": {"id": sender}, "text": rng.choice(MIX)}})
+    return updates
+
+class Recorder:
+    def __init__(self):
+        self.commands = []
+
+    def submit(self, text):
+        self.commands.append(text)
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Commander backlog catch-up benchmark")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--hours", type=float, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    common.add_common_args(parser)
+    args = parser.parse_args()
+
+    backlog = make_backlog(args.updates, args.hours)
+    api = common.FakeBotApi(backlog)
+    transport_module.API_BASE = api.url
+    commander.CHAT_ID = str(OWNER)
+    commander.TRANSPORT = transport_module.TelegramTransport("bench")
+    owner_commands = sum(1 for u in backlog if u["message"]["from"]["id"] == OWNER)
+    captures_before = [u for u in backlog
+                       if u["message"]["from"]["id"] == OWNER and u["message"]["text"] == "/capture"]
+
+    path = os.path.join(DATA_DIR, OFFSET_FILE_NAME)
+    latencies = []
+    for _ in range(args.rounds):
+        if os.path.exists(path):
+            os.remove(path)
+        recorder = Recorder()
+        start = time.perf_counter()
+        with common.quiet():
+            offset = commander.catch_up(OffsetStore(path), recorder.submit)
+        latencies.append(time.perf_counter() - start)
+
+    assert offset == backlog[-1]["update_id"] + 1, offset
+    assert OffsetStore(path).load() == offset, "offset not persisted"
+    captures = [c for c in recorder.commands if c.startswith("/capture")]
+    assert len(captures) <= 1 and "/lock" not in recorder.commands, recorder.commands
+
+    # Restart: the persisted offset means nothing is re-run
+    restart = Recorder()
+    with common.quiet():
+        commander.catch_up(OffsetStore(path), restart.submit)
+    assert not restart.commands, restart.commands
+
+    print(f"Backlog of {args.updates} updates ({owner_commands} owner commands, "
+          f"{(args.updates + 99) // 100} getUpdates pages) -> {len(recorder.commands)} run: "
+          f"{', '.join(recorder.commands)}")
+    print(f"Without coalescing: {owner_commands} commands, {len(captures_before)} camera opens")
+    print(f"Restart after catch-up re-ran {len(restart.commands)} commands\n")
+    api.close()
+    return common.finish({"backlog_catch_up": common.summarize(latencies)}, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
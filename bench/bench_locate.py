@@ -0,0 +1,117 @@
+"""
+/locate pipeline: netsh parser checked against captured outputs
+(bench/fixtures/netsh_*.txt), then response time of a cold, a cached
+and a post-TTL locate with simulated scan / geo-IP latencies, next to
+the old sequential scan-then-lookup.
+
+    python bench/bench_locate.py
+    python bench/bench_locate.py --scan-ms 900 --geo-ms 300
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+common.setup_paths()
+
+from locate import Locator, parse_netsh_networks, format_report
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (ssid, bssid, signal, channel), strongest first
+EXPECTED = {
+    "netsh_en.txt": [
+        ("HomeNet", "3c:84:6a:11:22:34", 91, 44),
+        ("HomeNet", "3c:84:6a:11:22:33", 62, 6),
+        ("Cafe Guest: Free", "f0:9f:c2:aa:bb:cc", 40, 11),
+        ("", "00:1a:2b:3c:4d:5e", 18, 1),
+    ],
+    "netsh_win11.txt": [
+        ("Office-IoT", "a4:2b:b0:01:02:04", 99, 6),
+        ("Office-5G", "a4:2b:b0:01:02:03", 78, 149),
+    ],
+    "netsh_de.txt": [
+        ("FRITZ!Box 7590 XY", "44:4e:6d:de:ad:01", 84, 36),
+        ("Nachbar", "44:4e:6d:be:ef:02", 23, 13),
+    ],
+    "netsh_off.txt": [],
+}
+
+GEO = {"status": "success", "lat": 52.52, "lon": 13.40, "city": "Berlin",
+       "isp": "Bench ISP", "query": "203.0.113.7"}
+
+def check_fixtures():
+    """Parse every fixture; returns per-call parse latencies"""
+    latencies = []
+    for name, expected in EXPECTED.items():
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            output = f.read()
+        records = parse_netsh_networks(output)
+        got = [(r["ssid"], r["bssid"], r["signal"], r["channel"]) for r in records]
+        if got != expected:
+            raise AssertionError(f"{name}: parsed {got}, expected {expected}")
+        for _ in range(200):
+            start = time.perf_counter()
+            parse_netsh_networks(output)
+            latencies.append(time.perf_counter() - start)
+    print(f"[✓] netsh parser matches {len(EXPECTED)} fixtures")
+    return latencies
+
+def bench_locate(scan_s, geo_s, rounds):
+    with open(os.path.join(FIXTURES_DIR, "netsh_en.txt"), "r", encoding="utf-8") as f:
+        scans = [parse_netsh_networks(f.read())]
+    # Second scan: the hidden AP is gone, a new one is in range
+    moved = [r for r in scans[0] if r["ssid"]] + [
+        {"ssid": "Bus-WiFi", "bssid": "02:00:00:00:00:01", "signal": 55, "channel": 1}]
+    scans.append(moved)
+
+    def scanner():
+        time.sleep(scan_s)
+        calls.append(scan_s)
+        return scans[min(1, len(calls) - 1)]
+
+    def geo():
+        time.sleep(geo_s)
+        return GEO
+
+    results = {"locate_sequential": [], "locate_cold": [], "locate_cached": [], "locate_rescan": []}
+    for _ in range(rounds):
+        start = time.perf_counter()
+        time.sleep(scan_s)
+        geo()
+        results["locate_sequential"].append(time.perf_counter() - start)
+
+        calls = []  # Scans done by this locator
+        locator = Locator(None, wifi_ttl=0.2, geo_ttl=600, scanner=scanner, geo=geo)
+        for name in ("locate_cold", "locate_cached"):
+            start = time.perf_counter()
+            locator.locate()
+            results[name].append(time.perf_counter() - start)
+        time.sleep(0.25)  # WiFi TTL expires, geo-IP stays cached
+        start = time.perf_counter()
+        result = locator.locate()
+        results["locate_rescan"].append(time.perf_counter() - start)
+        delta = result["delta"]
+        assert [r["ssid"] for r in delta["appeared"]] == ["Bus-WiFi"], delta
+        assert [r["bssid"] for r in delta["disappeared"]] == ["00:1a:2b:3c:4d:5e"], delta
+        format_report(result)
+    return {name: common.summarize(samples) for name, samples in results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="/locate pipeline benchmark")
+    parser.add_argument("--scan-ms", type=float, default=900, help="simulated netsh scan time")
+    parser.add_argument("--geo-ms", type=float, default=300, help="simulated geo-IP round trip")
+    parser.add_argument("--rounds", type=int, default=5)
+    common.add_common_args(parser)
+    args = parser.parse_args()
+
+    results = {"netsh_parse": common.summarize(check_fixtures())}
+    results.update(bench_locate(args.scan_ms / 1000, args.geo_ms / 1000, args.rounds))
+    print()
+    return common.finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
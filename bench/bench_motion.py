@@ -0,0 +1,71 @@
+"""
+CPU cost per frame of the locked-workstation motion watch.
+Synthetic 640x480 BGR frames: sensor noise, then an object moving in.
+
+    python bench/bench_motion.py                # per-frame cost + CPU% at --fps
+    python bench/bench_motion.py --save-baseline
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+common.setup_paths()
+
+import numpy as np
+from motion import MotionDetector
+
+def make_frames(n, width, height, seed=1):
+    """Static noisy scene; an object enters at n/2"""
+    rng = np.random.default_rng(seed)
+    scene = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        noise = rng.integers(-6, 7, size=scene.shape, dtype=np.int16)
+        frame = np.clip(scene.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if i >= n // 2:
+            x = min(width - 120, (i - n // 2) * 8)
+            frame[height // 3:height // 3 + 160, x:x + 120] = 250
+        frames.append(frame)
+    return frames
+
+def bench_detector(frames, step):
+    detector = MotionDetector(step=step)
+    wall, cpu = [], []
+    first_trigger = None
+    for i, frame in enumerate(frames):
+        w0, c0 = time.perf_counter(), time.process_time()
+        moved = detector.feed(frame)
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+        if moved and first_trigger is None:
+            first_trigger = i
+    return wall, cpu, first_trigger
+
+def main():
+    parser = argparse.ArgumentParser(description="Motion watch CPU benchmark")
+    parser.add_argument("--frames", type=int, default=400)
+    parser.add_argument("--fps", type=float, default=4, help="sampling rate used for the CPU%% estimate")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    common.add_common_args(parser)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.width, args.height)
+    results = {}
+    for step in (4, 8):
+        wall, cpu, first_trigger = bench_detector(frames, step)
+        name = f"motion_step{step}"
+        results[name] = common.summarize(wall)
+        cpu_per_frame = sum(cpu) / len(cpu)
+        print(f"{name}: {cpu_per_frame * 1000:.3f} ms CPU/frame -> "
+              f"{cpu_per_frame * args.fps * 100:.2f}% of one core at {args.fps:g} FPS, "
+              f"first trigger at frame {first_trigger} (object enters at {args.frames // 2})")
+    print()
+    return common.finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
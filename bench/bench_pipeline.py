@@ -0,0 +1,235 @@
+"""
+Per-stage microbenchmarks for the detection-to-alert pipeline.
+Runs on Linux with fake event, camera and HTTP backends.
+
+    python bench/bench_pipeline.py                  # run + compare to baseline
+    python bench/bench_pipeline.py --save-baseline  # record a new baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+DATA_DIR = common.setup_paths()
+
+import monitor
+from camera import CameraSession, fake_source_factory, capture_intruder_bytes, capture_intruder_file
+from eventsource import ReplayEventSource
+from outbox import Outbox
+from backlog import OffsetStore
+
+# --------------------------------------------------
+# STAGES
+# --------------------------------------------------
+def bench_event_detection(n, spacing=0.002):
+    """Replay -> monitor_failed_logins read/filter, measured at detection"""
+    path = os.path.join(DATA_DIR, "bench_events.jsonl")
+    inserts = [""] * 21
+    inserts[5], inserts[6], inserts[10] = "bench", "PC", "2"
+    with open(path, "w") as f:
+        for i in range(n):
+            # Every 4th record is noise the filter has to skip
+            event_id = 4624 if i % 4 == 3 else 4625
+            f.write(json.dumps({"offset": i * spacing, "record_number": i + 1,
+                                "event_id": event_id, "inserts": inserts}) + "\n")
+
+    latencies = []
+    real_parse = monitor.parse_failed_logon
+
+    def timed_parse(event):
+        latencies.append(time.time() - event.time_generated)
+        return real_parse(event)
+
+    monitor.parse_failed_logon = timed_parse
+    real_handle = monitor.handle_decisions
+    monitor.handle_decisions = lambda decisions: None
+    monitor.CAM_KEEP_WARM = False
+    try:
+        source = ReplayEventSource(path, None, speed=1.0)
+        start = time.perf_counter()
+        with common.quiet():
+            monitor.monitor_failed_logins(threading.Event(), source)
+        wall = time.perf_counter() - start
+    finally:
+        monitor.parse_failed_logon = real_parse
+        monitor.handle_decisions = real_handle
+    return common.summarize(latencies, wall)
+
+def bench_catch_up(n, rounds=5, hours=2.0):
+    """Startup catch-up of n records logged while the service was down"""
+    path = os.path.join(DATA_DIR, "bench_backlog_events.jsonl")
+    accounts = ["bench", "admin", "guest"]
+    last_failure = 0
+    with open(path, "w") as f:
+        for i in range(n):
+            inserts = [""] * 21
+            inserts[5], inserts[6], inserts[10] = accounts[i % 7 % 3], "PC", "2"
+            event_id = 4624 if i % 4 == 3 else 4625
+            if event_id == 4625:
+                last_failure = i + 1
+            # Negative offset = logged before the source opened
+            f.write(json.dumps({"offset": -hours * 3600 * (1 - i / n), "record_number": i + 1,
+                                "event_id": event_id, "inserts": inserts}) + "\n")
+
+    class FakeOutbox:
+        def __init__(self):
+            self.texts = []
+
+        def put_text(self, text, priority):
+            self.texts.append(text)
+
+    real_outbox, real_handle = monitor.outbox, monitor.handle_decisions
+    monitor.handle_decisions = lambda decisions: None
+    samples = []
+    try:
+        for _ in range(rounds):
+            monitor.outbox = FakeOutbox()
+            if os.path.exists(monitor.BOOKMARK_PATH):
+                os.remove(monitor.BOOKMARK_PATH)
+            OffsetStore(monitor.BOOKMARK_PATH).save(0)
+            source = ReplayEventSource(path, 4625)
+            start = time.perf_counter()
+            with common.quiet():
+                monitor.monitor_failed_logins(threading.Event(), source)
+            samples.append(time.perf_counter() - start)
+            assert len(monitor.outbox.texts) == 1, monitor.outbox.texts
+            assert OffsetStore(monitor.BOOKMARK_PATH).load() == last_failure, "bookmark not advanced"
+        print(monitor.outbox.texts[0] + "\n")
+
+        # A torn bookmark counts as a first run, not as "everything was missed"
+        with open(monitor.BOOKMARK_PATH, "w") as f:
+            f.write('{"offs')
+        monitor.outbox = FakeOutbox()
+        with common.quiet():
+            monitor.monitor_failed_logins(threading.Event(), ReplayEventSource(path, 4625))
+        assert not monitor.outbox.texts, "corrupt bookmark replayed the whole log"
+        assert OffsetStore(monitor.BOOKMARK_PATH).load() == n, "bookmark not reset"
+    finally:
+        monitor.outbox, monitor.handle_decisions = real_outbox, real_handle
+    return common.summarize(samples)
+
+def bench_capture(n, open_delay, read_delay):
+    """Cold (open per call) vs warm (armed session) capture + encode"""
+    results = {}
+
+    cold = CameraSession(source_factory=fake_source_factory(open_delay, read_delay))
+    samples = []
+    for _ in range(max(3, n // 10)):
+        t0 = time.perf_counter()
+        capture_intruder_bytes(session=cold)
+        samples.append(time.perf_counter() - t0)
+    results["capture_cold_encode"] = common.summarize(samples)
+
+    warm = CameraSession(idle_timeout=60, source_factory=fake_source_factory(open_delay, read_delay))
+    warm.arm(block=True)
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        capture_intruder_bytes(session=warm)
+        samples.append(time.perf_counter() - t0)
+    results["capture_warm_encode"] = common.summarize(samples)
+
+    samples = []
+    for _ in range(max(3, n // 5)):
+        t0 = time.perf_counter()
+        capture_intruder_bytes(session=warm, burst=5)
+        samples.append(time.perf_counter() - t0)
+    results["capture_warm_burst5"] = common.summarize(samples)
+
+    capture_dir = os.path.join(DATA_DIR, "captures")
+    os.makedirs(capture_dir, exist_ok=True)
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        path = capture_intruder_file(capture_dir, session=warm)
+        samples.append(time.perf_counter() - t0)
+        if path:
+            os.remove(path)
+    results["capture_warm_file"] = common.summarize(samples)
+    warm.disarm()
+    return results
+
+def bench_queue_handoff(n):
+    """Producer put_photo() -> sender woken with the item in hand"""
+    box = Outbox(os.path.join(DATA_DIR, "bench_outbox.db"))
+    latencies = []
+    put_times = {}
+    done = threading.Event()
+
+    def sender():
+        while len(latencies) < n:
+            items = box.next_ready(limit=10)
+            if not items:
+                box.wait(1)
+                continue
+            now = time.perf_counter()
+            for item in items:
+                latencies.append(now - put_times[item.id])
+                box.ack(item.id)
+        done.set()
+
+    threading.Thread(target=sender, daemon=True).start()
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        item_id = box.put_photo(f"/bench/{i}.jpg", "bench")
+        put_times[item_id] = t0
+        time.sleep(0.001)  # Producer spacing, like real alerts
+    done.wait(30)
+    wall = time.perf_counter() - start
+    box.close()
+    return common.summarize(latencies, wall)
+
+def bench_upload(n, rtt):
+    """send_telegram_photo through the pooled transport and a fake API"""
+    common.install_fake_http(monitor.transport, rtt=rtt)
+    monitor.BOT_TOKEN = monitor.BOT_TOKEN or "bench"
+    monitor.CHAT_ID = monitor.CHAT_ID or "1"
+    # Same image every time: measure the upload, not the dedup shortcut
+    monitor.dedup = None
+    # Per-chat pacing (1 msg/s) is policy, not pipeline cost
+    monitor.transport.limiter = None
+
+    warm = CameraSession(source_factory=fake_source_factory(0, 0))
+    jpeg = capture_intruder_bytes(session=warm)
+    path = os.path.join(DATA_DIR, "bench_upload.jpg")
+    with open(path, "wb") as f:
+        f.write(jpeg)
+
+    results = {}
+    for name, image in (("upload_file", path), ("upload_memory", jpeg)):
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            monitor.send_telegram_photo(image, "bench")
+            samples.append(time.perf_counter() - t0)
+        results[name] = common.summarize(samples)
+    return results
+
+# --------------------------------------------------
+# MAIN
+# --------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="WatchDog pipeline microbenchmarks")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--open-delay", type=float, default=0.5, help="fake camera open cost (s)")
+    parser.add_argument("--read-delay", type=float, default=0.005, help="fake camera frame cost (s)")
+    parser.add_argument("--rtt", type=float, default=0.0, help="fake API round trip (s)")
+    common.add_common_args(parser)
+    args = parser.parse_args()
+
+    results = {}
+    results["event_detection"] = bench_event_detection(args.iterations)
+    results["eventlog_catch_up_10k"] = bench_catch_up(10000)
+    results.update(bench_capture(args.iterations, args.open_delay, args.read_delay))
+    results["queue_handoff"] = bench_queue_handoff(args.iterations)
+    results.update(bench_upload(args.iterations, args.rtt))
+    return common.finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
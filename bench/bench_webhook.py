@@ -0,0 +1,126 @@
+"""
+Command latency: webhook push vs getUpdates long polling.
+Both modes run the commander's real receive paths against localhost:
+synthetic updates are POSTed to the webhook receiver, and served by a
+fake Bot API (long-held getUpdates) to the polling loop. Latency is
+measured from the update's arrival to its hand-off to the executor.
+
+    python bench/bench_webhook.py
+    python bench/bench_webhook.py --updates 100 --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+DATA_DIR = common.setup_paths()
+
+import commander
+import transport as transport_module
+import webhook
+
+OWNER = "1"
+
+class RecordingExecutor:
+    """Stands in for CommandExecutor: records when each command arrives"""
+    def __init__(self):
+        self.arrived = {}
+        self.cond = threading.Condition()
+
+    def submit(self, text):
+        with self.cond:
+            self.arrived[int(text.split()[1])] = time.perf_counter()
+            self.cond.notify_all()
+        return True
+
+    def wait_for(self, update_id, timeout=60):
+        with self.cond:
+            return self.cond.wait_for(lambda: update_id in self.arrived, timeout)
+
+def make_update(update_id):
+    return {"update_id": update_id,
+            "message": {"from": {"id": int(OWNER)}, "text": f"/ping {update_id}"}}
+
+# --------------------------------------------------
+# STAGES
+# --------------------------------------------------
+def bench_polling(n, gap):
+    api = common.FakeBotApi()
+    transport_module.API_BASE = api.url
+    executor = RecordingExecutor()
+    commander.EXECUTOR = executor
+    commander.COMMANDER_MODE = "threaded"
+    commander.WEBHOOK_CONFIG = {}
+    threading.Thread(target=commander.start_commander_loop, daemon=True).start()
+
+    latencies = []
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i in range(1, n + 1):
+        # Owner messages arrive at random points of the poll cycle
+        time.sleep(rng.uniform(0, gap))
+        sent = time.perf_counter()
+        api.push(make_update(i))
+        executor.wait_for(i)
+        latencies.append(executor.arrived[i] - sent)
+    return common.summarize(latencies, time.perf_counter() - start)
+
+def bench_webhook(n, gap):
+    executor = RecordingExecutor()
+    commander.EXECUTOR = executor
+    secret = webhook.secret_from_token("bench")
+    server = webhook.WebhookServer("127.0.0.1", 0, "/telegram", secret, commander.dispatch_update)
+    server.start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    headers = {"Content-Type": "application/json", webhook.SECRET_HEADER: secret}
+
+    latencies = []
+    rng = random.Random(1)
+    start = time.perf_counter()
+    try:
+        for i in range(1, n + 1):
+            time.sleep(rng.uniform(0, gap))
+            sent = time.perf_counter()
+            conn.request("POST", "/telegram", body=json.dumps(make_update(i)), headers=headers)
+            conn.getresponse().read()
+            executor.wait_for(i)
+            latencies.append(executor.arrived[i] - sent)
+
+        # Forged pushes must never reach the executor
+        conn.close()
+        conn.request("POST", "/telegram", body=json.dumps(make_update(n + 1)),
+                     headers={"Content-Type": "application/json", webhook.SECRET_HEADER: "wrong"})
+        status = conn.getresponse().status
+        assert status == 403 and n + 1 not in executor.arrived, "forged update accepted"
+    finally:
+        conn.close()
+        server.stop()
+    return common.summarize(latencies, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook vs long polling command latency")
+    parser.add_argument("--updates", type=int, default=40)
+    parser.add_argument("--gap", type=float, default=1.0, help="max random pause between owner messages (s)")
+    common.add_common_args(parser)
+    args = parser.parse_args()
+
+    commander.CHAT_ID = OWNER
+    commander.CAPTURES_DIR = DATA_DIR
+    commander.BOT_TOKEN = "bench"
+    commander.TRANSPORT = transport_module.TelegramTransport("bench")
+
+    results = {}
+    with common.quiet():
+        results["cmd_latency_webhook"] = bench_webhook(args.updates, args.gap)
+        results["cmd_latency_polling"] = bench_polling(args.updates, args.gap)
+    return common.finish(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Shared helpers for the WatchDog benchmarks: latency stats, baselines,
+and fake backends (HTTP) so every stage runs on Linux without hardware.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT_DIR, "service")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def setup_paths():
+    """Make service modules importable and keep captures out of ProgramData"""
+    if SERVICE_DIR not in sys.path:
+        sys.path.insert(0, SERVICE_DIR)
+    if not os.getenv("WATCHDOG_BENCH_DATA"):
+        os.environ["WATCHDOG_BENCH_DATA"] = tempfile.mkdtemp(prefix="watchdog_bench_")
+    # monitor.py derives CAPTURES_DIR from PROGRAMDATA
+    os.environ["PROGRAMDATA"] = os.environ["WATCHDOG_BENCH_DATA"]
+    return os.environ["WATCHDOG_BENCH_DATA"]
+
+# --------------------------------------------------
+# STATS
+# --------------------------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples, wall_time=None):
+    """samples: per-operation latencies in seconds"""
+    values = sorted(samples)
+    total = wall_time if wall_time is not None else sum(values)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+        "throughput_per_s": (len(values) / total) if total > 0 else 0.0,
+    }
+
+def print_table(results):
+    print(f"{'stage':<28}{'n':>7}{'p50 ms':>11}{'p99 ms':>11}{'max ms':>11}{'ops/s':>12}")
+    print("-" * 80)
+    for name, r in results.items():
+        print(f"{name:<28}{r['count']:>7}{r['p50_ms']:>11.3f}{r['p99_ms']:>11.3f}{r['max_ms']:>11.3f}{r['throughput_per_s']:>12.1f}")
+
+# --------------------------------------------------
+# BASELINES
+# --------------------------------------------------
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+    print(f"[✓] Baseline saved to {path}")
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages (p50/p99 slower than threshold)"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            old, new = base.get(key, 0), r[key]
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append(f"{name} {key}: {old:.3f} -> {new:.3f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def finish(results, args):
+    """Print, compare against the baseline, optionally save. Returns exit code."""
+    print_table(results)
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, args.threshold)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+    if regressions:
+        print(f"\n[X] Regressions beyond {args.threshold * 100:.0f}%:")
+        for line in regressions:
+            print(f"    {line}")
+        return 1
+    if baseline:
+        print(f"\n[✓] No regressions beyond {args.threshold * 100:.0f}%")
+    return 0
+
+def add_common_args(parser):
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON path")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="regression threshold (0.20 = 20%%)")
+
+# --------------------------------------------------
+# FAKE HTTP
+# --------------------------------------------------
+def install_fake_http(transport, rtt=0.0, status=200, body=None):
+    """Route every request of a TelegramTransport to an in-process fake"""
+    import requests
+    from requests.adapters import BaseAdapter
+
+    payload = json.dumps(body if body is not None else {"ok": True, "result": []}).encode()
+
+    class FakeAdapter(BaseAdapter):
+        def __init__(self):
+            super().__init__()
+            self.requests = 0
+
+        def send(self, request, **kwargs):
+            # Force the multipart body to be built, like a real upload
+            if hasattr(request.body, "read"):
+                request.body.read()
+            if rtt:
+                time.sleep(rtt)
+            self.requests += 1
+            resp = requests.Response()
+            resp.status_code = status
+            resp._content = payload
+            resp.url = request.url
+            resp.request = request
+            return resp
+
+        def close(self):
+            pass
+
+    adapter = FakeAdapter()
+    transport.session.mount("https://", adapter)
+    transport.session.mount("http://", adapter)
+    return adapter
+
+class FakeBotApi:
+    """
+    Localhost Bot API serving getUpdates like Telegram: long-held until an
+    update at or past `offset` exists, at most `limit` per answer.
+    Point the transport at it with transport.API_BASE = api.url.
+    """
+    def __init__(self, updates=None):
+        from urllib.parse import urlparse, parse_qs
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.updates = list(updates or [])
+        self.calls = 0
+        self.cond = threading.Condition()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are separate writes
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                offset = int(query.get("offset", ["0"])[0])
+                timeout = float(query.get("timeout", ["0"])[0])
+                limit = int(query.get("limit", ["100"])[0])
+                with api.cond:
+                    api.calls += 1
+                    api.cond.wait_for(lambda: any(u["update_id"] >= offset for u in api.updates), timeout)
+                    result = [u for u in api.updates if u["update_id"] >= offset][:limit]
+                body = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def push(self, update):
+        with self.cond:
+            self.updates.append(update)
+            self.cond.notify_all()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+_devnull = None
+
+def quiet():
+    """Context manager silencing the service's print() logging"""
+    global _devnull
+    import contextlib
+    if _devnull is None:
+        _devnull = open(os.devnull, "w")
+    return contextlib.redirect_stdout(_devnull)
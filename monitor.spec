@@ -6,7 +6,7 @@ a = Analysis(
     pathex=['.'],
     binaries=[],
     datas=[],
-    hiddenimports=['pyautogui', 'PIL', 'service.commander', 'service.camera'],
+    hiddenimports=['pyautogui', 'PIL', 'service.commander', 'service.camera', 'service.eventsource', 'service.outbox', 'service.transport', 'service.ratelimit', 'service.connectivity', 'service.executor', 'service.sysinfo', 'service.sampler', 'service.detector', 'service.motion', 'service.dedup', 'service.ipc', 'service.webhook', 'service.locate', 'service.backlog', 'service.perf', 'psutil'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -26,7 +26,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX'd DLLs are decompressed on every launch; slower boot
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
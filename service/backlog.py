@@ -0,0 +1,83 @@
+import os
+import json
+import time
+
+OFFSET_FILE_NAME = "commander_offset.json"
+
+# --------------------------------------------------
+# getUpdates OFFSET
+# --------------------------------------------------
+class OffsetStore:
+    """
+    A resume position on disk: the commander's getUpdates offset (so a
+    restart doesn't re-run everything Telegram still holds) and the
+    service's Security log bookmark. Writes are atomic (temp file +
+    fsync + rename) and skipped when nothing changed.
+    """
+    def __init__(self, path, label="update offset"):
+        self.path = path
+        self.label = label  # For log messages
+        self.offset = None
+
+    def load(self):
+        """The saved position, or None if there is none (first run) or it is unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                self.offset = int(json.load(f)["offset"])
+        except FileNotFoundError:
+            self.offset = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[ERROR] Ignoring unreadable {self.label} ({self.path}): {e}")
+            self.offset = None
+        return self.offset
+
+    def save(self, offset):
+        if offset == self.offset:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"offset": offset, "saved_at": time.time()}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            # Keep polling; worst case the next start re-runs a few commands
+            print(f"[ERROR] Could not save {self.label}: {e}")
+            return
+        self.offset = offset
+
+# --------------------------------------------------
+# COALESCING
+# --------------------------------------------------
+def coalesce(commands, rules, now=None):
+    """
+    commands: [(sent_at, text)] oldest first, e.g. one getUpdates batch
+    or the whole backlog found at boot.
+    rules: action -> {"latest": True} to keep only the newest of that
+    action (ten /capture -> one), {"max_age": s} to drop it once older
+    than s seconds (a /lock from last night), or both. Exact repeats of
+    any command collapse to the newest copy.
+    now: clock to age commands against, on the same clock as sent_at
+    (Telegram's); None skips max_age, for live batches sent just now.
+    Returns (to_run, superseded, stale), each [(sent_at, text)] in
+    original order.
+    """
+    newest = {}
+    keys = []
+    for index, (sent_at, text) in enumerate(commands):
+        action = text.lower().split()[0]
+        key = action if rules.get(action, {}).get("latest") else " ".join(text.lower().split())
+        newest[key] = index
+        keys.append(key)
+
+    to_run, superseded, stale = [], [], []
+    for index, (sent_at, text) in enumerate(commands):
+        max_age = rules.get(text.lower().split()[0], {}).get("max_age")
+        if newest[keys[index]] != index:
+            superseded.append((sent_at, text))
+        elif now is not None and max_age is not None and now - sent_at > max_age:
+            stale.append((sent_at, text))
+        else:
+            to_run.append((sent_at, text))
+    return to_run, superseded, stale
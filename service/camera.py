@@ -1,36 +1,436 @@
 # import cv2  <-- Moved inside function
 import time
 import os
+import threading
+import itertools
 
-def capture_intruder_file(save_dir, cam_index=0, prefix="capture_"):
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+# --------------------------------------------------
+# FRAME SOURCES
+# --------------------------------------------------
+def open_device(cam_index=0):
+    """Open the real webcam (DirectShow on Windows for faster init)"""
+    import cv2
+    return cv2.VideoCapture(cam_index, cv2.CAP_DSHOW)
+
+
+class FakeFrameSource:
+    """
+    Drop-in stand-in for cv2.VideoCapture.
+    Simulates device-open and per-frame cost so capture latency can be
+    benchmarked without hardware.
+    """
+    def __init__(self, cam_index=0, open_delay=0.5, read_delay=0.03, width=640, height=480):
+        time.sleep(open_delay)
+        self.cam_index = cam_index
+        self.read_delay = read_delay
+        try:
+            import numpy as np
+            self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        except ImportError:
+            self.frame = bytearray(width * height * 3)
+        self._open = True
+
+    def isOpened(self):
+        return self._open
+
+    def read(self):
+        if not self._open:
+            return False, None
+        time.sleep(self.read_delay)
+        return True, self.frame
+
+    def release(self):
+        self._open = False
+
+
+def fake_source_factory(open_delay=0.5, read_delay=0.03):
+    """Returns a source_factory producing FakeFrameSource devices"""
+    return lambda cam_index: FakeFrameSource(cam_index, open_delay, read_delay)
+
+# --------------------------------------------------
+# CAMERA SESSION (WARM DEVICE)
+# --------------------------------------------------
+class CameraSession:
+    """
+    Keeps the capture device open while "armed" (e.g. workstation locked,
+    failed PIN seen) so frames are handed out without reopening.
+    The device is released after idle_timeout seconds without a frame
+    request. Unarmed reads open and release the device per call.
+    Bursts and clips take a lease (acquire/release) instead: the device
+    stays open until the last lease is returned, whatever the armed state.
+    """
+    def __init__(self, cam_index=0, idle_timeout=20.0, source_factory=None):
+        self.cam_index = cam_index
+        self.idle_timeout = idle_timeout
+        self.source_factory = source_factory or open_device
+
+        self.armed = False
+        self.leases = 0  # Bursts / clips currently holding the device open
+        self.stats = {"opens": 0, "frames": 0, "warm_frames": 0}
+
+        self._cam = None
+        self._burst = None  # Preallocated burst buffers, see capture_burst()
+        self._lock = threading.RLock()
+        self._last_used = 0
+        self._wake = threading.Event()
+        self._reaping = False  # A reaper is running and has not decided to exit
+
+    def _ensure_open(self):
+        if self._cam is not None:
+            return True
+        with perf.span("camera_open"):
+            cam = self.source_factory(self.cam_index)
+        if cam is None or not cam.isOpened():
+            if cam is not None:
+                cam.release()
+            return False
+        self._cam = cam
+        self.stats["opens"] += 1
+        return True
+
+    def _close_device(self):
+        if self._cam is not None:
+            try:
+                self._cam.release()
+            except Exception:
+                pass
+            self._cam = None
+
+    def arm(self, block=False):
+        """Open the device now and keep it warm until idle timeout"""
+        with self._lock:
+            self._last_used = time.time()
+            if self.armed:
+                return
+            self.armed = True
+            # Not is_alive(): a reaper on its way out still reports alive
+            if not self._reaping:
+                self._reaping = True
+                self._wake.clear()
+                threading.Thread(target=self._reaper_loop, daemon=True).start()
+
+        if block:
+            self._open_armed()
+        else:
+            threading.Thread(target=self._open_armed, daemon=True).start()
+
+    def _open_armed(self):
+        with self._lock:
+            if self.armed:
+                try:
+                    self._ensure_open()
+                except Exception as e:
+                    print(f"[ERROR] Camera prewarm failed: {e}")
+
+    def disarm(self):
+        with self._lock:
+            self.armed = False
+            if not self.leases:
+                self._close_device()
+        self._wake.set()
+
+    def acquire(self):
+        """Hold the device open for a burst or clip (pair with release())"""
+        with self._lock:
+            self.leases += 1
+
+    def release(self):
+        """Return a lease; the last one closes the device unless armed"""
+        with self._lock:
+            self.leases = max(0, self.leases - 1)
+            if not self.leases and not self.armed:
+                self._close_device()
+
+    def _reaper_loop(self):
+        while True:
+            with self._lock:
+                if not self.armed:
+                    self._reaping = False
+                    return
+                idle = time.time() - self._last_used
+                remaining = self.idle_timeout - idle
+                if remaining <= 0:
+                    print("[DEBUG] Camera idle, releasing device")
+                    self.armed = False
+                    if not self.leases:
+                        self._close_device()
+                    self._reaping = False
+                    return
+            self._wake.wait(remaining)
+            self._wake.clear()
+
+    def read(self):
+        """Return one frame (or None). Reuses the open device when armed."""
+        with self._lock:
+            warm = self._cam is not None
+            if not self._ensure_open():
+                return None
+
+            # Immediate read
+            with perf.span("camera_read"):
+                ret, frame = self._cam.read()
+                if not ret:
+                    # Ultra-fast retry
+                    time.sleep(0.01)
+                    ret, frame = self._cam.read()
+
+            self._last_used = time.time()
+            if not self.armed and not self.leases:
+                self._close_device()
+
+            if not ret:
+                # Device may have gone stale while held open
+                self._close_device()
+                return None
+
+            self.stats["frames"] += 1
+            if warm:
+                self.stats["warm_frames"] += 1
+            return frame
+
+    def close(self):
+        self.disarm()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(cam_index=0, idle_timeout=None, source_factory=None):
+    """Process-wide session per device index (created on first use)"""
+    with _sessions_lock:
+        session = _sessions.get(cam_index)
+        if session is None:
+            session = CameraSession(cam_index, source_factory=source_factory)
+            _sessions[cam_index] = session
+        if idle_timeout is not None:
+            session.idle_timeout = idle_timeout
+        if source_factory is not None:
+            session.source_factory = source_factory
+        return session
+
+# --------------------------------------------------
+# CAPTURE
+# --------------------------------------------------
+def prewarm():
     """
-    Captures a single frame and saves it to the specified directory.
+    Import cv2/numpy and run one tiny encode so the first real capture
+    doesn't pay for DLL loading. Does not open the device (no LED).
+    """
+    import numpy as np
+    import cv2
+    cv2.imencode(".jpg", np.zeros((8, 8, 3), dtype=np.uint8))
+
+def encode_jpeg(frame):
+    """Encode a frame to JPEG bytes in memory (no disk I/O)"""
+    import cv2
+    with perf.span("encode"):
+        ok, buf = cv2.imencode(".jpg", frame)
+    return buf.tobytes() if ok else None
+
+_name_seq = itertools.count()
+
+def capture_name(prefix="capture_", ext=".jpg"):
+    """prefix + local time to the millisecond + per-process sequence"""
+    now = time.time()
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+    return f"{prefix}{stamp}_{int(now * 1000) % 1000:03d}_{next(_name_seq)}{ext}"
+
+def save_capture_bytes(data, save_dir, prefix="capture_", ext=".jpg"):
+    """
+    Persist already-encoded bytes under a new, unique name. The file is
+    created exclusively, so two captures can never overwrite each other.
+    """
+    while True:
+        save_path = os.path.join(save_dir, capture_name(prefix, ext))
+        try:
+            with open(save_path, "xb") as f:
+                f.write(data)
+            return save_path
+        except FileExistsError:
+            continue
+
+# --------------------------------------------------
+# BURST / BEST FRAME
+# --------------------------------------------------
+def score_frame(frame, gray, lap):
+    """
+    Sharpness (variance of the Laplacian) weighted by exposure quality
+    (mean brightness near mid-grey, few clipped pixels). gray / lap are
+    preallocated uint8 / float32 buffers of the frame's size.
+    """
+    import numpy as np
+    import cv2
+    if frame.ndim == 2:
+        np.copyto(gray, frame)
+    else:
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+    cv2.Laplacian(gray, cv2.CV_32F, dst=lap)
+    sharpness = float(lap.var())
+
+    mean = float(gray.mean())
+    clipped = (np.count_nonzero(gray <= 5) + np.count_nonzero(gray >= 250)) / gray.size
+    exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0) * (1.0 - clipped)
+    return sharpness * exposure
+
+def capture_burst(session, frames=5, top_n=1):
+    """
+    Grab `frames` consecutive frames into the session's preallocated
+    buffers and return the best `top_n` as [(score, frame)], best first.
+    Only the winners are copied out. Returns [] if the camera failed.
+    """
+    import numpy as np
+
+    with session._lock:
+        # One device open for the whole burst
+        session.acquire()
+        try:
+            count = 0
+            buf = None
+            for _ in range(frames):
+                frame = session.read()
+                if frame is None:
+                    break
+                buf = session._burst
+                if buf is None or buf["frames"].shape[0] < frames or buf["frames"].shape[1:] != frame.shape:
+                    buf = session._burst = {
+                        "frames": np.empty((frames,) + frame.shape, dtype=frame.dtype),
+                        "gray": np.empty(frame.shape[:2], dtype=np.uint8),
+                        "lap": np.empty(frame.shape[:2], dtype=np.float32),
+                        "scores": np.empty(frames, dtype=np.float64),
+                    }
+                    count = 0  # Shape changed mid-burst: start over
+                np.copyto(buf["frames"][count], frame)
+                count += 1
+
+            if not count:
+                return []
+            with perf.span("burst_score"):
+                scores = buf["scores"]
+                for i in range(count):
+                    scores[i] = score_frame(buf["frames"][i], buf["gray"], buf["lap"])
+                best = np.argsort(scores[:count])[::-1][:top_n]
+            return [(float(scores[i]), buf["frames"][i].copy()) for i in best]
+        finally:
+            session.release()
+
+def capture_best_bytes(cam_index=0, session=None, burst=5, top_n=1):
+    """Burst capture; returns the top_n frames JPEG-encoded (best first)"""
+    try:
+        if session is None:
+            session = get_session(cam_index)
+        if burst <= 1:
+            frame = session.read()
+            frames = [frame] if frame is not None else []
+        else:
+            frames = [frame for _, frame in capture_burst(session, burst, top_n)]
+        return [data for data in map(encode_jpeg, frames) if data]
+    except Exception as e:
+        print(f"[ERROR] Camera capture failed: {e}")
+    return []
+
+def capture_intruder_bytes(cam_index=0, session=None, burst=1):
+    """
+    Captures a frame (the sharpest of `burst` frames) and returns it
+    JPEG-encoded in memory. Returns None if failed. Lets callers stream
+    straight into an upload.
+    """
+    images = capture_best_bytes(cam_index, session, burst)
+    return images[0] if images else None
+
+def capture_intruder_file(save_dir, cam_index=0, prefix="capture_", session=None, burst=1):
+    """
+    Captures a frame (the sharpest of `burst` frames) and saves it to the
+    specified directory under a unique name.
     Returns the absolute path of the saved file, or None if failed.
-    Optimized for speed (no warmup).
+    Reuses the warm session if armed.
     """
+    data = capture_intruder_bytes(cam_index, session, burst)
+    if data is None:
+        return None
     try:
-        import cv2
-        # Use DirectShow on Windows for faster init
-        cam = cv2.VideoCapture(cam_index, cv2.CAP_DSHOW)
-        
-        # Immediate read
-        ret, frame = cam.read()
-        
-        if not ret:
-            # Ultra-fast retry
-            time.sleep(0.01)
-            ret, frame = cam.read()
-
-        cam.release()
-        
-        if ret:
-            timestamp = int(time.time())
-            filename = f"{prefix}{timestamp}.jpg"
-            save_path = os.path.join(save_dir, filename)
-            cv2.imwrite(save_path, frame)
-            return save_path
-            
+        with perf.span("write"):
+            return save_capture_bytes(data, save_dir, prefix)
     except Exception as e:
         print(f"[ERROR] Camera capture failed: {e}")
-        
     return None
+
+# --------------------------------------------------
+# CLIP RECORDING
+# --------------------------------------------------
+def record_clip(save_dir, seconds, cam_index=0, session=None, fps=10, width=320,
+                segment_seconds=5, prefix="clip_", on_segment=None):
+    """
+    Records `seconds` of video at reduced resolution, cut into MP4 segments
+    of `segment_seconds`. on_segment(path, index) is called as soon as each
+    segment is closed, so uploads overlap with recording. Frames are resized
+    into one reused buffer and written straight to disk: memory use does not
+    grow with clip length. Returns the segment paths.
+    """
+    import numpy as np
+    import cv2
+
+    if session is None:
+        session = get_session(cam_index)
+    # Hold the device open for the whole clip
+    session.acquire()
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    frames_per_segment = max(1, int(fps * segment_seconds))
+    total_frames = max(1, int(fps * seconds))
+    interval = 1.0 / fps
+    base = capture_name(prefix, "")
+
+    small = None
+    writer = None
+    path = None
+    paths = []
+
+    def close_segment():
+        writer.release()
+        paths.append(path)
+        if on_segment:
+            try:
+                on_segment(path, len(paths) - 1)
+            except Exception as e:
+                print(f"[ERROR] Segment handler failed: {e}")
+
+    try:
+        next_due = time.perf_counter()
+        for n in range(total_frames):
+            frame = session.read()
+            if frame is None:
+                print("[ERROR] Clip recording: camera returned no frame")
+                break
+
+            if small is None:
+                height = max(2, int(frame.shape[0] * width / frame.shape[1]) // 2 * 2)
+                small = np.empty((height, width, 3), dtype=np.uint8)
+            with perf.span("clip_frame"):
+                cv2.resize(frame, (small.shape[1], small.shape[0]), dst=small, interpolation=cv2.INTER_AREA)
+
+            if n % frames_per_segment == 0:
+                if writer is not None:
+                    close_segment()
+                path = os.path.join(save_dir, f"{base}_{len(paths):02d}.mp4")
+                writer = cv2.VideoWriter(path, fourcc, fps, (small.shape[1], small.shape[0]))
+            writer.write(small)
+
+            # Fixed frame pacing (skip the sleep if the camera is slower)
+            next_due += interval
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_due = time.perf_counter()
+    finally:
+        if writer is not None:
+            close_segment()
+        session.release()
+
+    return paths
+
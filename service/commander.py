@@ -1,46 +1,267 @@
-import threading
 import time
-import requests
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 import ctypes
 import sys
+import threading
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+try:
+    from outbox import Outbox, OUTBOX_DB_NAME, PRIORITY_REPLY, PRIORITY_BACKLOG
+    from transport import get_transport
+    from executor import CommandExecutor
+    import sysinfo
+    from sampler import MetricsRing, METRICS_FILE_NAME, summarize, parse_window, format_window
+    import perf
+    from dedup import DedupCache
+    from ipc import CaptureBroker, default_address, authkey_from_token
+    import webhook
+    from locate import Locator, format_report as format_location
+    from backlog import OffsetStore, OFFSET_FILE_NAME, coalesce
+except ImportError:
+    from service.outbox import Outbox, OUTBOX_DB_NAME, PRIORITY_REPLY, PRIORITY_BACKLOG
+    from service.transport import get_transport
+    from service.executor import CommandExecutor
+    import service.sysinfo as sysinfo
+    from service.sampler import MetricsRing, METRICS_FILE_NAME, summarize, parse_window, format_window
+    import service.perf as perf
+    from service.dedup import DedupCache
+    from service.ipc import CaptureBroker, default_address, authkey_from_token
+    import service.webhook as webhook
+    from service.locate import Locator, format_report as format_location
+    from service.backlog import OffsetStore, OFFSET_FILE_NAME, coalesce
 
 # Global configuration
 BOT_TOKEN = None
 CHAT_ID = None
 CAPTURES_DIR = None
+OUTBOX = None
+TRANSPORT = None
+EXECUTOR = None
+DEDUP = None
+BROKER = None  # IPC link to the service's capture engine
+COMMANDER_MODE = "threaded"
+COMMANDER_WORKERS = 3
+CAMERA_CONFIG = {}
+CLIP_DEFAULT_SECONDS = 10
+WEBHOOK_CONFIG = {}
+LOCATOR = None
+LOCATE_CONFIG = {}
+METRICS_INTERVAL = 60  # Service sampler period; /stat trusts rows younger than two of these
+POLL_TIMEOUT = 30  # getUpdates long poll (seconds)
+
+# Lower runs first. Heavy commands yield to quick ones.
+COMMAND_PRIORITY = {
+    "/lock": 0,
+    "/ping": 0,
+    "/help": 1,
+    "/msg": 2,
+    "/capture": 3,
+    "/screen": 3,
+    "/clip": 4,
+    "/perf": 1,
+    "/stat": 6,
+    "/locate": 6,
+}
+# Backlog coalescing: snapshot-style commands only need their newest copy,
+# and a /lock sent hours ago must not lock the owner out at login
+COMMAND_FRESHNESS = {
+    "/capture": {"latest": True},
+    "/screen": {"latest": True},
+    "/clip": {"latest": True, "max_age": 600},
+    "/stat": {"latest": True},
+    "/locate": {"latest": True},
+    "/perf": {"latest": True},
+    "/ping": {"latest": True},
+    "/help": {"latest": True},
+    "/lock": {"latest": True, "max_age": 120},
+}
+# Commands sharing a device, and how many may use it at once
+COMMAND_RESOURCES = {"/capture": "camera", "/clip": "camera", "/screen": "display"}
+RESOURCE_LIMITS = {"camera": 1, "display": 1}
 
 def init_commander(config, captures_dir):
-    global BOT_TOKEN, CHAT_ID, CAPTURES_DIR
+    global BOT_TOKEN, CHAT_ID, CAPTURES_DIR, OUTBOX, TRANSPORT, EXECUTOR
+    global COMMANDER_MODE, COMMANDER_WORKERS, CAMERA_CONFIG, DEDUP, BROKER, WEBHOOK_CONFIG
+    global LOCATOR, LOCATE_CONFIG, METRICS_INTERVAL
     BOT_TOKEN = config['telegram']['bot_token']
     CHAT_ID = str(config['telegram']['chat_id'])
     CAPTURES_DIR = captures_dir
+    TRANSPORT = get_transport(config)
+    COMMANDER_MODE = config.get("commander", {}).get("mode", "threaded")
+    COMMANDER_WORKERS = config.get("commander", {}).get("workers", 3)
+    CAMERA_CONFIG = config.get("camera", {})
+    WEBHOOK_CONFIG = config.get("commander", {}).get("webhook", {})
+    METRICS_INTERVAL = config.get("metrics", {}).get("interval_seconds", 60)
+    # WiFi scan + geo-IP run concurrently, cached between /locate calls
+    LOCATE_CONFIG = config.get("locate", {})
+    LOCATOR = Locator.from_config(TRANSPORT, LOCATE_CONFIG)
+    # Repeated /screen or /capture of an unchanged scene -> one upload
+    DEDUP = DedupCache.from_config(config.get("dedup", {}))
+    if COMMANDER_MODE != "async":
+        EXECUTOR = CommandExecutor(
+            execute_command,
+            workers=COMMANDER_WORKERS,
+            priorities=COMMAND_PRIORITY,
+            resources=COMMAND_RESOURCES,
+            limits=RESOURCE_LIMITS
+        )
+    # Shared with the service process, which delivers anything we park here
+    try:
+        OUTBOX = Outbox(os.path.join(captures_dir, OUTBOX_DB_NAME))
+    except Exception as e:
+        print(f"[ERROR] Outbox unavailable: {e}")
+    # The service owns the webcam; /capture and /clip are forwarded to it
+    if config.get("ipc", {}).get("enabled", True):
+        try:
+            BROKER = CaptureBroker(
+                config.get("ipc", {}).get("address") or default_address(captures_dir),
+                authkey_from_token(BOT_TOKEN)
+            )
+            BROKER.start()
+        except Exception as e:
+            BROKER = None
+            print(f"[ERROR] IPC unavailable, using the camera directly: {e}")
+    # Command timings, merged into the service's Prometheus export
+    try:
+        perf.PerfExporter(
+            os.path.join(captures_dir, perf.COMMANDER_PERF_FILE_NAME),
+            process="commander",
+            interval=config.get("perf", {}).get("export_interval_seconds", 30)
+        ).start()
+    except Exception as e:
+        print(f"[ERROR] Perf exporter unavailable: {e}")
 
 def send_reply(text):
-    """Send text reply to Telegram"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    """Send text reply to Telegram (queued in the outbox if offline)"""
     payload = {"chat_id": CHAT_ID, "text": text}
-    try:
-        requests.post(url, json=payload, timeout=10)
-    except:
-        pass
+    # Known offline: park it right away instead of waiting for a timeout
+    if TRANSPORT.connectivity is None or TRANSPORT.connectivity.is_online():
+        try:
+            resp = TRANSPORT.call("sendMessage", json=payload, priority=PRIORITY_REPLY)
+            if resp.status_code == 200:
+                return
+        except:
+            pass
+    if OUTBOX:
+        OUTBOX.put_text(text, PRIORITY_REPLY)
 
-def send_photo(photo_path, caption=None):
-    """Send photo to Telegram"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
+def send_photo(photo, caption=None, photo_hash=None):
+    """
+    Send photo to Telegram (file path or in-memory JPEG bytes).
+    photo_hash: its perceptual hash, computed by whoever already has the
+    image decoded (the service for /capture), so we never load cv2 here.
+    """
+    if DEDUP is not None:
+        if DEDUP.check(photo_hash):
+            send_reply("🟰 Nothing changed since the last image (upload skipped)")
+            return True
+        caption = (caption or "") + DEDUP.note()
+    data = {"chat_id": CHAT_ID}
+    if caption:
+        data["caption"] = caption
     try:
-        with open(photo_path, "rb") as f:
-            files = {"photo": f}
-            data = {"chat_id": CHAT_ID}
-            if caption:
-                data["caption"] = caption
-            requests.post(url, data=data, files=files, timeout=20)
+        if isinstance(photo, (bytes, bytearray)):
+            files = {"photo": ("capture.jpg", photo, "image/jpeg")}
+            ok = TRANSPORT.call("sendPhoto", data=data, files=files, priority=PRIORITY_REPLY).status_code == 200
+        else:
+            with open(photo, "rb") as f:
+                files = {"photo": f}
+                ok = TRANSPORT.call("sendPhoto", data=data, files=files, priority=PRIORITY_REPLY).status_code == 200
+        if ok and DEDUP is not None:
+            DEDUP.record(photo_hash)
+        return ok
     except Exception as e:
         print(f"[ERROR] Upload failed: {e}")
+        return False
+
+def send_video(path, caption=None):
+    """Send an MP4 segment to Telegram (bulk: yields to replies)"""
+    data = {"chat_id": CHAT_ID, "supports_streaming": "true"}
+    if caption:
+        data["caption"] = caption
+    try:
+        with open(path, "rb") as f:
+            return TRANSPORT.call("sendVideo", data=data, files={"video": f}, priority=PRIORITY_BACKLOG).status_code == 200
+    except Exception as e:
+        print(f"[ERROR] Video upload failed: {e}")
+        return False
+
+def upload_segment(path, caption):
+    """Upload a closed clip segment; park it in the outbox if that fails"""
+    if send_video(path, caption):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    elif OUTBOX:
+        OUTBOX.put_video(path, caption, PRIORITY_BACKLOG)
+
+def capture_photo_bytes():
+    """
+    Best-of-burst JPEG from the service over IPC, or the local camera.
+    Returns (data, dedup hash); data is None if the camera failed.
+    """
+    burst = CAMERA_CONFIG.get("burst_frames", 5)
+    if BROKER is not None and BROKER.connected:
+        try:
+            header, data = BROKER.request("capture", timeout=20, burst=burst, hash=DEDUP is not None)
+            return data, header.get("hash")
+        except (OSError, EOFError, TimeoutError) as e:
+            # Stale link (service restarted or hung): the camera is free
+            print(f"[ERROR] IPC capture failed, using the camera directly: {e}")
+        except Exception as e:
+            # The service answered: its camera failed
+            print(f"[ERROR] IPC capture failed: {e}")
+            return None, None
+    # Lazy import to save RAM (only when the service is unreachable)
+    try:
+        from service.camera import capture_intruder_bytes
+    except ImportError:
+        from camera import capture_intruder_bytes
+    data = capture_intruder_bytes(CAMERA_CONFIG.get("device_index", 0), burst=burst)
+    # cv2 is loaded for the capture anyway
+    return data, DEDUP.hash(data) if data and DEDUP is not None else None
+
+def record_local_clip(seconds):
+    """Record with our own camera handle; segments upload as they close"""
+    try:
+        from service.camera import record_clip
+    except ImportError:
+        from camera import record_clip
+
+    # One uploader thread: segment N uploads while N+1 records
+    uploader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-upload")
+    try:
+        return record_clip(
+            CAPTURES_DIR, seconds,
+            CAMERA_CONFIG.get("device_index", 0),
+            fps=CAMERA_CONFIG.get("clip_fps", 10),
+            width=CAMERA_CONFIG.get("clip_width", 320),
+            segment_seconds=CAMERA_CONFIG.get("clip_segment_seconds", 5),
+            prefix="cmd_clip_",
+            on_segment=lambda path, index: uploader.submit(
+                upload_segment, path, f"🎥 Remote clip (part {index + 1})")
+        )
+    except Exception as e:
+        print(f"[ERROR] Clip recording failed: {e}")
+        return []
+    finally:
+        uploader.shutdown(wait=True)
 
 def execute_command(command_text):
+    """Run a command, timed per action (see /perf)"""
+    action = CommandExecutor.action_of(command_text)
+    if action not in COMMAND_PRIORITY:
+        # Unknown commands are not timed (keeps the metric set bounded)
+        return run_command(command_text)
+    with perf.span(f"cmd_{action[1:]}"):
+        run_command(command_text)
+
+def run_command(command_text):
     """Parse and execute commands"""
     cmd = command_text.lower().strip().split()
     if not cmd:
@@ -53,36 +274,61 @@ def execute_command(command_text):
         send_reply("🏓 Pong! WatchDog is watching. System is online.")
 
     elif action == "/capture":
-        # Lazy import to save RAM
-        try:
-            from service.camera import capture_intruder_file
-        except ImportError:
-            from camera import capture_intruder_file
-        
         send_reply("📸 Capturing photo...")
-        filepath = capture_intruder_file(CAPTURES_DIR, prefix="cmd_")
-        if filepath:
-            send_photo(filepath, "📸 Remote capture requested")
-            try:
-                os.remove(filepath)
-            except:
-                pass
+        # Sharpest frame of a burst, encoded in memory and streamed to
+        # the upload (no temp file)
+        data, photo_hash = capture_photo_bytes()
+        if data:
+            send_photo(data, "📸 Remote capture requested", photo_hash)
         else:
             send_reply("❌ Camera unavailable")
 
+    elif action == "/clip":
+        # Usage: /clip [seconds]
+        try:
+            seconds = int(cmd[1]) if len(cmd) > 1 else CLIP_DEFAULT_SECONDS
+        except ValueError:
+            send_reply("⚠️ Usage: /clip [seconds]")
+            return
+        max_seconds = CAMERA_CONFIG.get("clip_max_seconds", 60)
+        seconds = max(1, min(seconds, max_seconds))
+
+        send_reply(f"🎥 Recording {seconds}s clip...")
+        recorded = None
+        if BROKER is not None and BROKER.connected:
+            # The service records and queues each segment in its outbox
+            try:
+                header, _ = BROKER.request("clip", timeout=seconds + 30, seconds=seconds,
+                                           caption="🎥 Remote clip")
+                recorded = header.get("segments", 0)
+            except (OSError, EOFError, TimeoutError) as e:
+                print(f"[ERROR] IPC clip failed, using the camera directly: {e}")
+            except Exception as e:
+                print(f"[ERROR] IPC clip failed: {e}")
+                recorded = 0
+        if recorded is None:
+            recorded = len(record_local_clip(seconds))
+        if not recorded:
+            send_reply("❌ Camera unavailable")
+
     elif action == "/screen":
         send_reply("🖥️ Taking screenshot...")
         try:
             import pyautogui
             import pyautogui
-            timestamp = int(time.time())
-            filename = f"cmd_screen_{timestamp}.png" # Prefix cmd_ to avoid monitor auto-upload
+            try:
+                from service.camera import capture_name
+            except ImportError:
+                from camera import capture_name
+            filename = capture_name("cmd_screen_", ".png") # Prefix cmd_ to avoid monitor auto-upload
             filepath = os.path.join(CAPTURES_DIR, filename)
             
             screenshot = pyautogui.screenshot()
             screenshot.save(filepath)
+            # Hashed with Pillow (pyautogui's image type), not cv2
+            photo_hash = DEDUP.hash(screenshot) if DEDUP is not None else None
             
-            send_photo(filepath, "🖥️ Desktop Screenshot")
+            send_photo(filepath, "🖥️ Desktop Screenshot", photo_hash)
             os.remove(filepath)
         except Exception as e:
             send_reply(f"❌ Screenshot failed: {e}")
@@ -114,239 +360,398 @@ def execute_command(command_text):
                 except Exception as e:
                     print(f"[ERROR] Failed to open notepad: {e}")
 
-            threading.Thread(target=show_notepad_msg, args=(message,)).start()
+            show_notepad_msg(message)
         else:
             send_reply("⚠️ Usage: /msg [Your Message]")
             
     elif action == "/locate":
-        send_reply("📡 Scanning WiFi Spectrum & Geolocation...")
-        
-        def fetch_loc():
-            import subprocess
-            
-            # 1. Scan Nearby WiFi Networks (Triangulation Data)
-            wifi_list = []
-            try:
-                si = subprocess.STARTUPINFO()
-                si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                output = subprocess.check_output(
-                    ["netsh", "wlan", "show", "networks", "mode=bssid"], 
-                    startupinfo=si, 
-                    encoding="utf-8", 
-                    errors="ignore"
-                )
-                
-                current_ssid = "Unknown"
-                for line in output.split("\n"):
-                    line = line.strip()
-                    if line.startswith("SSID"):
-                        # Format: "SSID 1 : Name"
-                        parts = line.split(":", 1)
-                        if len(parts) > 1:
-                            current_ssid = parts[1].strip()
-                    elif line.startswith("BSSID"):
-                        # Format: "BSSID 1 : 00:xx:..."
-                        parts = line.split(":", 1)
-                        if len(parts) > 1:
-                            bssid = parts[1].strip()
-                            wifi_list.append(f"📶 {current_ssid}\n   `{bssid}`")
-                    elif line.startswith("Signal"):
-                         # Add signal to last entry
-                         if wifi_list:
-                             parts = line.split(":", 1)
-                             if len(parts) > 1:
-                                 wifi_list[-1] += f" ({parts[1].strip()})"
-            except Exception as e:
-                wifi_list.append(f"Scan Error: {e}")
-
-            # 2. Get IP & Geo
-            try:
-                info = requests.get("http://ip-api.com/json/", timeout=10).json()
-                if info.get("status") == "success":
-                    map_link = f"https://maps.google.com/?q={info['lat']},{info['lon']}"
-                    
-                    # Format WiFi Data (Top 8 strong signals)
-                    wifi_report = "\n".join(wifi_list[:8]) if wifi_list else "No WiFi networks found."
-                    
-                    msg = (f"📍 *Detailed Location Report*\n"
-                           f"--------------------------------\n"
-                           f"🌍 *IP-Based Info*:\n"
-                           f"   City: {info['city']}\n"
-                           f"   ISP: {info['isp']}\n"
-                           f"   IP: {info['query']}\n"
-                           f"   🔗 [Google Maps]({map_link})\n\n"
-                           f"📡 *Nearby WiFi (Triangulation Data)*:\n"
-                           f"{wifi_report}\n\n"
-                           f"_Copy BSSIDs to Wigle.net for precise coord_")
-                    send_reply(msg)
-                else:
-                    send_reply(f"❌ Geo-IP Failed. WiFi Scan:\n" + "\n".join(wifi_list[:5]))
-            except Exception as e:
-                send_reply(f"❌ Err: {e}")
-        
-        threading.Thread(target=fetch_loc).start()
+        # "/locate now" skips the cache
+        force = len(cmd) > 1 and cmd[1] in ("now", "fresh", "refresh")
+        if force or not LOCATOR.cached():
+            send_reply("📡 Scanning WiFi Spectrum & Geolocation...")
+        try:
+            result = LOCATOR.locate(force=force)
+            send_reply(format_location(result, LOCATE_CONFIG.get("max_networks", 8)))
+        except Exception as e:
+            send_reply(f"❌ Err: {e}")
 
     elif action == "/help":
         help_text = (
             "🛡️ *WatchDog Command Center*\n\n"
             "• /ping - Check status\n"
             "• /capture - Take photo\n"
+            "• /clip [sec] - Record video clip\n"
             "• /screen - Screenshot\n"
             "• /stat - System Status\n"
-            "• /locate - Get Location\n"
+            "• /stat 1h - History (min/avg/max)\n"
+            "• /perf - Latency breakdown\n"
+            "• /locate [now] - Get Location (cached)\n"
             "• /lock - Lock PC\n"
             "• /msg [text] - Show popup"
         )
         send_reply(help_text)
 
+    elif action == "/perf":
+        # Service hot paths come from its periodic snapshot; ours are live
+        try:
+            service = perf.load_snapshot(os.path.join(CAPTURES_DIR, perf.PERF_FILE_NAME))
+        except (OSError, ValueError):
+            service = None
+        report = perf.format_report({"service": service, "commander": perf.snapshot()})
+        http = TRANSPORT.stats()
+        report += (f"\n🔌 *HTTP*: {http['requests']} requests, {http['errors']} errors, "
+                   f"{http['connections_opened']} connections opened, {http['connections_reused']} reused")
+        limits = http.get("rate_limit")
+        if limits:
+            report += (f"\n🚦 *Rate limit*: {limits['queued']} waiting, {limits['throttled']} throttled (429), "
+                       f"avg/max wait {limits['wait_avg']:.1f}/{limits['wait_max']:.1f}s")
+        if EXECUTOR is not None:
+            queue = EXECUTOR.stats()
+            report += (f"\n🧵 *Commands*: {queue['queue_depth']} queued (max {queue['max_depth']}), "
+                       f"{queue['running']} running, {queue['deduplicated']} deduplicated, "
+                       f"avg/max wait {queue['wait_avg']:.1f}/{queue['wait_max']:.1f}s")
+        send_reply(report)
+
     elif action == "/stat":
-        send_reply("📊 Analyzing System Vital Signs...")
-        
-        def get_status():
+        # Usage: /stat (now) or /stat 1h (history recorded by the service)
+        if len(cmd) > 1:
+            seconds = parse_window(cmd[1])
+            if not seconds:
+                send_reply("⚠️ Usage: /stat [30m|1h|1d]")
+                return
             try:
-                import shutil
-                import subprocess
-                import platform
-                from datetime import datetime
-                
-                # Helper to run WMIC safely
-                def wmic_get(property_cmd):
-                    try:
-                        si = subprocess.STARTUPINFO()
-                        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                        # Adding /value to ensure format "Key=Value"
-                        # cmd string execution via shell=True for path compatibility
-                        full_cmd = f"wmic {property_cmd} /value"
-                        output = subprocess.check_output(full_cmd, startupinfo=si, shell=True).decode("utf-8", errors="ignore").strip()
-                        
-                        # Parsing "Key=Value" robustly
-                        lines = [line.strip() for line in output.splitlines() if line.strip()]
-                        for line in lines:
-                            if "=" in line:
-                                parts = line.split("=", 1)
-                                if len(parts) == 2:
-                                    return parts[1].strip()
-                        return None
-                    except:
-                        return None
-
-                # 1. System Info
-                os_name = wmic_get("os get Caption")
-                if not os_name:
-                    os_name = f"{platform.system()} {platform.release()}"
-
-                # 2. Boot Time
-                boot_time = "Unknown"
-                raw_boot = wmic_get("os get LastBootUpTime") # 20260116...
-                if raw_boot and "." in raw_boot:
-                    try:
-                         # Parse YYYYMMDDHHMMSS
-                        ts = raw_boot.split(".")[0]
-                        dt = datetime.strptime(ts, "%Y%m%d%H%M%S")
-                        boot_time = dt.strftime("%Y-%m-%d %H:%M:%S")
-                    except:
-                        pass
-
-                # 3. CPU
-                cpu_info = "Unknown"
-                load = wmic_get("cpu get loadpercentage")
-                freq = wmic_get("cpu get CurrentClockSpeed")
-                if load or freq:
-                    cpu_info = f"{load or '?'}% (Freq: {freq or '?'}Mhz)"
-
-                # 4. RAM
-                ram_info = "Unknown"
-                visible_mem = wmic_get("os get TotalVisibleMemorySize")
-                free_mem = wmic_get("os get FreePhysicalMemory")
-                
-                if visible_mem and free_mem:
-                    try:
-                        total_k = int(visible_mem)
-                        free_k = int(free_mem)
-                        used_k = total_k - free_k
-                        
-                        total_gb = round(total_k / 1024 / 1024, 1)
-                        used_gb = round(used_k / 1024 / 1024, 1)
-                        percent = round((used_k / total_k) * 100, 1)
-                        ram_info = f"{used_gb}GB / {total_gb}GB ({percent}%)"
-                    except:
-                        pass
-
-                # 5. Disk
-                disk_info = "Unknown"
-                try:
-                    total, used, free = shutil.disk_usage("C:\\")
-                    total_gb = round(total / (2**30), 1)
-                    free_gb = round(free / (2**30), 1)
-                    percent = round((used / total) * 100, 1)
-                    disk_info = f"{free_gb}GB free / {total_gb}GB"
-                except:
-                    pass
-
-                # 6. Battery
-                battery_info = "N/A (Desktop/No Battery)"
-                charge = wmic_get("path Win32_Battery get EstimatedChargeRemaining")
-                status_code = wmic_get("path Win32_Battery get BatteryStatus")
-                
-                if charge:
-                    status_text = "Unknown"
-                    if status_code == "1": status_text = "🔋 On Battery"
-                    elif status_code in ["2", "6", "7", "8", "9"]: status_text = "🔌 Plugged In"
-                    
-                    battery_info = f"{charge}% ({status_text})"
-
-                # Construct Report
-                report = (
-                    f"📊 *System Statistics*\n"
-                    f"------------------------\n"
-                    f"💻 *System*: {os_name}\n"
-                    f"🧠 *CPU*: {cpu_info}\n"
-                    f"💾 *RAM*: {ram_info}\n"
-                    f"💿 *Disk (C:)*: {disk_info}\n"
-                    f"⚡ *Battery*: {battery_info}\n"
-                    f"⏱️ *Boot Time*: {boot_time}"
-                )
-                send_reply(report)
-                
+                ring = MetricsRing.load(os.path.join(CAPTURES_DIR, METRICS_FILE_NAME))
+                summary = summarize(ring.rows(since=time.time() - seconds))
+                send_reply(format_window(summary, cmd[1]))
+            except FileNotFoundError:
+                send_reply("📈 No metrics history yet.")
             except Exception as e:
                 send_reply(f"❌ Stat Error: {str(e)}")
+            return
+
+        # CPU from the service's latest sample when fresh (no sampling
+        # wait); everything else is a cheap point read
+        try:
+            latest = latest_sample()
+            cpu = round(latest["cpu"], 1) if latest else None
+            send_reply(sysinfo.format_report(sysinfo.collect(cpu)))
+        except Exception as e:
+            send_reply(f"❌ Stat Error: {str(e)}")
+
+def latest_sample():
+    """Newest row of the service's metrics history, or None if missing or stale"""
+    try:
+        latest = MetricsRing.load(os.path.join(CAPTURES_DIR, METRICS_FILE_NAME)).latest()
+    except Exception:
+        return None
+    if latest and time.time() - latest["time"] < 2 * METRICS_INTERVAL:
+        return latest
+    return None
+
+def command_from_update(update):
+    """Return the command text of an update if it comes from the OWNER"""
+    if "message" not in update:
+        return None
+    message = update["message"]
+    user_id = str(message.get("from", {}).get("id"))
+    text = message.get("text", "")
+
+    # Security: Only accept commands from OWNER
+    if user_id == CHAT_ID and text.startswith("/"):
+        return text
+    return None
+
+def stale_notice(stale, now):
+    """Tell the owner which backlog commands were too old to run"""
+    lines = ["⏭️ Not run, sent while WatchDog was offline and now too old:"]
+    for sent_at, text in stale:
+        lines.append(f"   • {text} ({(now - sent_at) / 60:.0f} min ago)")
+    lines.append("Send again if still needed.")
+    return "\n".join(lines)
+
+def dispatch_updates(updates, submit, now=None):
+    """
+    Coalesce a batch of updates (oldest first) and hand the survivors to
+    submit(text). now: Telegram's time, for the boot backlog only; live
+    batches are never dropped as stale (the local clock may be off).
+    """
+    commands = []
+    for update in updates:
+        text = command_from_update(update)
+        if text:
+            commands.append((update["message"].get("date") or now or time.time(), text))
+    to_run, superseded, stale = coalesce(commands, COMMAND_FRESHNESS, now)
+    if superseded:
+        perf.incr("cmd_coalesced", len(superseded))
+        print(f"[CMD] Skipped {len(superseded)} superseded: {', '.join(text for _, text in superseded)}")
+    if stale:
+        perf.incr("cmd_stale", len(stale))
+        print(f"[CMD] Skipped {len(stale)} stale: {', '.join(text for _, text in stale)}")
+        # Off the caller's thread (the asyncio loop in async mode)
+        threading.Thread(target=send_reply, args=(stale_notice(stale, now),), daemon=True).start()
+    for _, text in to_run:
+        if not submit(text):
+            print(f"[CMD] Duplicate in flight, ignored: {text}")
+
+def dispatch_update(update):
+    """Common entry for polled and webhook-pushed updates"""
+    # Bounded, prioritized worker pool
+    dispatch_updates([update], EXECUTOR.submit)
+
+def fetch_backlog(offset):
+    """
+    Everything Telegram kept while we were down, drained with
+    non-blocking getUpdates calls so it can be coalesced as one batch.
+    Returns (updates, next offset, Telegram's time from the Date header).
+    """
+    updates = []
+    retried = False
+    server_now = None
+    while True:
+        params = {"offset": offset, "timeout": 0, "limit": 100}
+        resp = TRANSPORT.call("getUpdates", params=params, http_method="GET")
+        server_now = server_time(resp)
+        result = resp.json()
+        if not result.get("ok"):
+            # A webhook left behind by a crash blocks getUpdates: remove it, retry once
+            if poll_conflict(result) and not retried:
+                retried = True
+                continue
+            break
+        batch = result.get("result", [])
+        if not batch:
+            break
+        updates += batch
+        offset = batch[-1]["update_id"] + 1
+    if updates:
+        print(f"[*] Catching up on {len(updates)} update(s) received while offline")
+    return updates, offset, server_now
+
+def server_time(resp):
+    """Telegram's clock (HTTP Date header): message dates are on it, ours may drift"""
+    try:
+        return parsedate_to_datetime(resp.headers["Date"]).timestamp()
+    except Exception:
+        return time.time()
+
+def catch_up(store, submit):
+    """Boot pass: one coalesced batch for the whole backlog. Returns the offset."""
+    offset = store.load() or 0  # None: everything Telegram still holds
+    try:
+        backlog, offset, now = fetch_backlog(offset)
+        dispatch_updates(backlog, submit, now)
+        store.save(offset)
+    except Exception as e:
+        print(f"[ERROR] Backlog catch-up failed: {e}")
+    return offset
+
+def poll_conflict(result):
+    """
+    getUpdates refuses to run while a webhook is set (e.g. left by a crash).
+    Returns True if that was the error and the webhook is now removed.
+    """
+    if result.get("error_code") == 409:
+        print("[NET] Webhook still registered, removing it to poll")
+        return webhook.delete_webhook(TRANSPORT)
+    return False
+
+# --------------------------------------------------
+# WEBHOOK MODE
+# --------------------------------------------------
+def run_webhook(dispatch):
+    """
+    Receive updates pushed by Telegram (through the inbound relay at
+    commander.webhook.public_url) instead of long polling. Blocks while
+    the webhook is healthy; returns after removing it when it cannot be
+    set up or Telegram reports it unreachable, so the caller polls.
+    """
+    url = WEBHOOK_CONFIG.get("public_url")
+    if not url:
+        print("[ERROR] commander.webhook.public_url not set, using polling")
+        return
+    path = WEBHOOK_CONFIG.get("path", "/telegram")
+    secret = WEBHOOK_CONFIG.get("secret_token") or webhook.secret_from_token(BOT_TOKEN)
+    server = webhook.WebhookServer(
+        WEBHOOK_CONFIG.get("listen_host", "127.0.0.1"),
+        WEBHOOK_CONFIG.get("listen_port", 8443),
+        path, secret, dispatch
+    )
+    try:
+        server.start()
+    except OSError as e:
+        print(f"[ERROR] Webhook receiver unavailable: {e}")
+        return
+
+    interval = WEBHOOK_CONFIG.get("health_check_seconds", 60)
+    try:
+        try:
+            if not webhook.set_webhook(TRANSPORT, url.rstrip("/") + path, secret):
+                return
+        except Exception as e:
+            print(f"[ERROR] setWebhook failed: {e}")
+            return
+        registered_at = time.time()
+        print("[*] Commander Service Started (Webhook Mode)")
 
-        threading.Thread(target=get_status).start()
+        while True:
+            time.sleep(interval)
+            try:
+                info = webhook.webhook_info(TRANSPORT)
+            except Exception:
+                continue  # Offline: polling would not do any better
+            if webhook.webhook_unreachable(info, registered_at, server.last_received):
+                print(f"[NET] Webhook unreachable ({info.get('last_error_message')}), falling back to polling")
+                return
+    finally:
+        server.stop()
+        webhook.delete_webhook(TRANSPORT)
 
 def start_commander_loop():
-    """Main polling loop using Long Polling"""
-    offset = 0
+    """Main loop: webhook mode if configured, otherwise (or after it fails) Long Polling"""
+    if COMMANDER_MODE == "async":
+        return start_commander_loop_async()
+
+    # Resume after the last update we handled, not at Telegram's backlog.
+    # Drained before a webhook is set too: Telegram would push the backlog
+    # one update at a time, leaving nothing to coalesce.
+    store = OffsetStore(os.path.join(CAPTURES_DIR, OFFSET_FILE_NAME))
+    offset = catch_up(store, EXECUTOR.submit)
+
+    if WEBHOOK_CONFIG.get("enabled"):
+        run_webhook(dispatch_update)
+        # Fell back: pick up what Telegram kept since the webhook failed
+        offset = catch_up(store, EXECUTOR.submit)
     print("[*] Commander Service Started (Low-RAM Polling Mode)")
     
-    session = requests.Session()
-    
     while True:
         try:
-            url = f"https://api.telegram.org/bot{BOT_TOKEN}/getUpdates"
             params = {
                 "offset": offset,
-                "timeout": 30  # Wait up to 30s for new message (Low CPU/RAM)
+                "timeout": POLL_TIMEOUT  # Wait up to 30s for new message (Low CPU/RAM)
             }
             
-            response = session.get(url, params=params, timeout=40)
+            response = TRANSPORT.call("getUpdates", params=params, http_method="GET")
             result = response.json()
 
             if result.get("ok"):
-                for update in result.get("result", []):
-                    offset = update["update_id"] + 1
-                    
-                    if "message" in update:
-                        message = update["message"]
-                        user_id = str(message.get("from", {}).get("id"))
-                        text = message.get("text", "")
-                        
-                        # Security: Only accept commands from OWNER
-                        if user_id == CHAT_ID and text.startswith("/"):
-                            # Run usage intensive tasks in thread
-                            threading.Thread(target=execute_command, args=(text,)).start()
+                updates = result.get("result", [])
+                if updates:
+                    offset = updates[-1]["update_id"] + 1
+                    dispatch_updates(updates, EXECUTOR.submit)
+                    store.save(offset)
+            else:
+                poll_conflict(result)
                             
         except Exception as e:
             # Silent error handling with backoff
             time.sleep(5)
             
         time.sleep(0.5)
+
+# --------------------------------------------------
+# ASYNCIO MODE
+# --------------------------------------------------
+class AsyncDispatcher:
+    """
+    asyncio-native counterpart of CommandExecutor: a priority queue drained
+    by worker coroutines. Blocking command bodies (cv2, pyautogui,
+    subprocess) run in a thread pool; resource limits use asyncio semaphores.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cmd")
+        self.queue = asyncio.PriorityQueue()
+        self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in RESOURCE_LIMITS.items()}
+        self.inflight = set()
+        self._seq = 0
+
+    def submit(self, text):
+        key = " ".join(text.lower().split())
+        if key in self.inflight:
+            return False
+        self.inflight.add(key)
+        action = CommandExecutor.action_of(text)
+        self._seq += 1
+        self.queue.put_nowait((COMMAND_PRIORITY.get(action, 5), self._seq, text, key))
+        return True
+
+    async def _run(self, text):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.pool, execute_command, text)
+
+    async def worker(self):
+        while True:
+            _, _, text, key = await self.queue.get()
+            sem = self.semaphores.get(COMMAND_RESOURCES.get(CommandExecutor.action_of(text)))
+            try:
+                if sem:
+                    async with sem:
+                        await self._run(text)
+                else:
+                    await self._run(text)
+            except Exception as e:
+                print(f"[ERROR] Command {text!r} failed: {e}")
+            finally:
+                self.inflight.discard(key)
+                self.queue.task_done()
+
+async def commander_main_async():
+    loop = asyncio.get_running_loop()
+    dispatcher = AsyncDispatcher(COMMANDER_WORKERS)
+    workers = [asyncio.create_task(dispatcher.worker()) for _ in range(dispatcher.workers)]
+    # Dedicated thread so the long poll never waits behind a slow command
+    poll_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="poll")
+
+    store = OffsetStore(os.path.join(CAPTURES_DIR, OFFSET_FILE_NAME))
+
+    async def catch_up_async(offset):
+        """catch_up() with the blocking fetch and save off the event loop"""
+        try:
+            backlog, offset, now = await loop.run_in_executor(poll_pool, fetch_backlog, offset)
+            dispatch_updates(backlog, dispatcher.submit, now)
+            await loop.run_in_executor(poll_pool, store.save, offset)
+        except Exception as e:
+            print(f"[ERROR] Backlog catch-up failed: {e}")
+        return offset
+
+    # Coalesced before a webhook is set, see start_commander_loop()
+    offset = await catch_up_async(await loop.run_in_executor(poll_pool, store.load) or 0)
+
+    if WEBHOOK_CONFIG.get("enabled"):
+        # Receiver threads hand updates over to the event loop
+        await loop.run_in_executor(
+            poll_pool, run_webhook,
+            lambda update: loop.call_soon_threadsafe(dispatch_updates, [update], dispatcher.submit)
+        )
+        offset = await catch_up_async(offset)
+    backoff = 1
+    print("[*] Commander Service Started (asyncio Mode)")
+
+    while True:
+        params = {"offset": offset, "timeout": POLL_TIMEOUT}
+        try:
+            response = await loop.run_in_executor(
+                poll_pool,
+                lambda: TRANSPORT.call("getUpdates", params=params, http_method="GET")
+            )
+            result = response.json()
+        except Exception:
+            # Back off on network errors only; no fixed sleep between polls
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+        backoff = 1
+
+        if result.get("ok"):
+            updates = result.get("result", [])
+            if updates:
+                offset = updates[-1]["update_id"] + 1
+                dispatch_updates(updates, dispatcher.submit)
+                # File and HTTP I/O stay on the poll thread, not the loop
+                await loop.run_in_executor(poll_pool, store.save, offset)
+        else:
+            await loop.run_in_executor(poll_pool, poll_conflict, result)
+        # Loop straight into the next long poll while commands run
+
+def start_commander_loop_async():
+    asyncio.run(commander_main_async())
@@ -0,0 +1,94 @@
+import time
+import threading
+
+UNKNOWN = "unknown"
+ONLINE = "online"
+OFFLINE = "offline"
+
+class ConnectivityMonitor:
+    """
+    Shared reachability state inferred from real request outcomes.
+    - Any HTTP response => ONLINE; connection errors/timeouts => OFFLINE
+    - While OFFLINE a background probe retries with exponential backoff
+    - wait_online() and reconnect listeners wake as soon as it's back
+    probe: callable returning True when reachable (pluggable for tests).
+    """
+    def __init__(self, probe, min_backoff=1.0, max_backoff=60.0):
+        self.probe = probe
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.state = UNKNOWN
+        self.changed_at = time.time()
+        self.counters = {"went_offline": 0, "went_online": 0, "probes": 0}
+
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._prober = None
+
+    def add_listener(self, callback):
+        """callback() runs on every OFFLINE -> ONLINE transition"""
+        self._listeners.append(callback)
+
+    def is_online(self):
+        """Optimistic: UNKNOWN counts as online so the first request is tried"""
+        return self.state != OFFLINE
+
+    def report_success(self):
+        if self.state == ONLINE:
+            return
+        with self._cond:
+            was_offline = self.state == OFFLINE
+            self.state = ONLINE
+            self.changed_at = time.time()
+            self._cond.notify_all()
+        if was_offline:
+            self.counters["went_online"] += 1
+            print("[NET] Connectivity restored")
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"[ERROR] Reconnect listener failed: {e}")
+
+    def report_failure(self):
+        with self._cond:
+            if self.state == OFFLINE:
+                return
+            self.state = OFFLINE
+            self.changed_at = time.time()
+            self.counters["went_offline"] += 1
+            print("[NET] Connectivity lost, probing with backoff")
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+                self._prober.start()
+
+    def _probe_loop(self):
+        backoff = self.min_backoff
+        while self.state == OFFLINE:
+            with self._cond:
+                # A real request may report success meanwhile and wake us
+                self._cond.wait_for(lambda: self.state != OFFLINE, timeout=backoff)
+            if self.state != OFFLINE:
+                return
+            self.counters["probes"] += 1
+            try:
+                reachable = self.probe()
+            except Exception:
+                reachable = False
+            if reachable:
+                self.report_success()
+                return
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def wait_online(self, timeout=None):
+        """Block until ONLINE/UNKNOWN (or timeout). Returns is_online()."""
+        with self._cond:
+            self._cond.wait_for(self.is_online, timeout=timeout)
+        return self.is_online()
+
+    def stats(self):
+        result = dict(self.counters)
+        result["state"] = self.state
+        result["since"] = self.changed_at
+        return result
@@ -0,0 +1,151 @@
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+# --------------------------------------------------
+# PERCEPTUAL HASHES (64 bit)
+# --------------------------------------------------
+def _load_gray(image):
+    """File path or encoded bytes -> small grayscale array (decoded at 1/8 scale)"""
+    import numpy as np
+    import cv2
+    if isinstance(image, (bytes, bytearray)):
+        gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    else:
+        gray = cv2.imread(image, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        raise ValueError("Undecodable image")
+    return gray
+
+def dhash(image):
+    """Difference hash: sign of horizontal gradients on a 9x8 thumbnail"""
+    import numpy as np
+    import cv2
+    thumb = cv2.resize(_load_gray(image), (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def phash(image):
+    """DCT hash: low 8x8 frequencies of a 32x32 thumbnail vs their median"""
+    import numpy as np
+    import cv2
+    thumb = cv2.resize(_load_gray(image), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:8, :8].ravel()
+    bits = low > np.median(low[1:])  # Skip DC: overall brightness only
+    return int(np.packbits(bits).view(">u8")[0])
+
+def dhash_pil(image):
+    """
+    dhash of a PIL image (e.g. a pyautogui screenshot) with Pillow alone,
+    so the commander never loads cv2 for /screen. Same bit layout as dhash.
+    """
+    from PIL import Image
+    pixels = list(image.convert("L").resize((9, 8), Image.BOX).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            value = (value << 1) | (pixels[row * 9 + col + 1] > left)
+    return value
+
+HASHES = {"dhash": dhash, "phash": phash}
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+# --------------------------------------------------
+# LRU INDEX
+# --------------------------------------------------
+class DedupCache:
+    """
+    LRU index of perceptual hashes of recent uploads.
+    An image within max_distance bits of an upload from the last
+    `window` seconds is suppressed; the next image that does go out
+    carries the number of suppressed images. A still-matching scene is
+    re-sent once per window, so a static camera never goes fully silent.
+    Hashes are recorded only after a successful upload (record()).
+    """
+    def __init__(self, max_distance=6, window=600, capacity=64, method="dhash"):
+        self.max_distance = max_distance
+        self.window = window
+        self.capacity = capacity
+        self.hash_image = HASHES.get(method, dhash)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # hash -> last upload time
+        self.pending = 0   # Suppressed since the last upload
+        self.suppressed = 0  # Total
+
+    @classmethod
+    def from_config(cls, config):
+        """None when disabled; config = the "dedup" section"""
+        if not config.get("enabled", True):
+            return None
+        return cls(
+            max_distance=config.get("max_distance", 6),
+            window=config.get("window_seconds", 600),
+            capacity=config.get("capacity", 64),
+            method=config.get("method", "dhash"),
+        )
+
+    def hash(self, image):
+        """
+        Hash of a path / JPEG bytes (configured method, decoded with cv2)
+        or of a PIL image (always dhash_pil). None if it can't be decoded.
+        """
+        try:
+            with perf.span("dedup_hash"):
+                if hasattr(image, "getdata"):
+                    return dhash_pil(image)
+                return self.hash_image(image)
+        except Exception as e:
+            print(f"[DEBUG] Perceptual hash failed: {e}")
+            return None
+
+    def check(self, h, now=None, also=()):
+        """
+        True if `h` should be suppressed (counts it as suppressed).
+        `also`: hashes about to be uploaded together with this one.
+        """
+        if h is None:
+            return False
+        if now is None:
+            now = time.time()
+        with self._lock:
+            match = next((known for known in also
+                          if known is not None and hamming(h, known) <= self.max_distance), None)
+            if match is None:
+                for known, uploaded in self._entries.items():
+                    if hamming(h, known) <= self.max_distance and now - uploaded < self.window:
+                        self._entries.move_to_end(known)
+                        match = known
+                        break
+            if match is None:
+                return False
+            self.pending += 1
+            self.suppressed += 1
+        perf.incr("dedup_suppressed")
+        return True
+
+    def record(self, h, now=None):
+        """Register a successful upload. Returns (and clears) the pending count."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if h is not None:
+                self._entries.pop(h, None)
+                self._entries[h] = now
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+            pending, self.pending = self.pending, 0
+        return pending
+
+    def note(self):
+        """Caption suffix for the next upload ('' if nothing was suppressed)"""
+        with self._lock:
+            pending = self.pending
+        return f"\n({pending} similar image{'s' if pending != 1 else ''} suppressed)" if pending else ""
@@ -0,0 +1,195 @@
+import time
+from array import array
+from collections import namedtuple
+
+# Event 4625 EventData / StringInserts positions
+INSERT_TARGET_USER = 5
+INSERT_TARGET_DOMAIN = 6
+INSERT_LOGON_TYPE = 10
+INSERT_IP_ADDRESS = 19
+
+MAX_TRACKED_IPS = 5
+
+FailedLogon = namedtuple("FailedLogon", ["account", "logon_type", "source_ip", "time"])
+
+# Detector decisions, consumed by the monitor
+Capture = namedtuple("Capture", ["account", "count", "reason"])
+Digest = namedtuple("Digest", ["account", "text"])
+
+def parse_failed_logon(event):
+    """Extract account / logon type / source IP from a 4625 LogEvent"""
+    inserts = event.inserts or ()
+
+    def field(index):
+        if index < len(inserts):
+            value = (inserts[index] or "").strip()
+            if value and value != "-":
+                return value
+        return None
+
+    user = field(INSERT_TARGET_USER) or "unknown"
+    domain = field(INSERT_TARGET_DOMAIN)
+    account = f"{domain}\\{user}" if domain else user
+    try:
+        logon_type = int(field(INSERT_LOGON_TYPE) or 0)
+    except ValueError:
+        logon_type = 0
+    return FailedLogon(account, logon_type, field(INSERT_IP_ADDRESS), event.time_generated)
+
+# --------------------------------------------------
+# SLIDING WINDOW COUNTER
+# --------------------------------------------------
+class SlidingCounter:
+    """
+    Event count over the last `window` seconds using a fixed ring of
+    per-slot counters (array('I')). O(1) add/count, constant memory.
+    """
+    __slots__ = ("slots", "width", "buckets", "last_slot")
+
+    def __init__(self, window, slots=12):
+        self.slots = slots
+        self.width = window / slots
+        self.buckets = array("I", [0]) * slots
+        self.last_slot = None
+
+    def _advance(self, now):
+        slot = int(now // self.width)
+        if self.last_slot is None:
+            self.last_slot = slot
+        elif slot > self.last_slot:
+            # Zero the buckets we skipped over (at most one full turn)
+            for s in range(self.last_slot + 1, min(slot, self.last_slot + self.slots) + 1):
+                self.buckets[s % self.slots] = 0
+            self.last_slot = slot
+        return slot
+
+    def add(self, now, amount=1):
+        slot = self._advance(now)
+        self.buckets[slot % self.slots] += amount
+
+    def count(self, now):
+        self._advance(now)
+        return sum(self.buckets)
+
+
+class _AccountState:
+    __slots__ = ("counter", "storm", "storm_start", "storm_total", "since_digest",
+                 "last_capture", "last_digest", "last_seen", "ips", "logon_types")
+
+    def __init__(self, window):
+        self.counter = SlidingCounter(window)
+        self.storm = False
+        self.storm_start = 0
+        self.storm_total = 0
+        self.since_digest = 0
+        self.last_capture = 0
+        self.last_digest = 0
+        self.last_seen = 0
+        self.ips = []
+        self.logon_types = set()
+
+# --------------------------------------------------
+# DETECTOR
+# --------------------------------------------------
+class BruteForceDetector:
+    """
+    Rate-based failed-logon detector, aggregated per target account.
+    - capture when >= threshold failures land inside `window` seconds
+      (old failures decay, so two typos a week apart never trigger)
+    - >= storm_threshold failures per window starts a storm: one capture
+      burst, then a digest message every digest_interval until it calms
+    """
+    def __init__(self, threshold=2, window=60, storm_threshold=20, burst_captures=3,
+                 digest_interval=60, capture_cooldown=10):
+        self.threshold = threshold
+        self.window = window
+        self.storm_threshold = storm_threshold
+        self.burst_captures = burst_captures
+        self.digest_interval = digest_interval
+        self.capture_cooldown = capture_cooldown
+        self.accounts = {}
+
+    @classmethod
+    def from_config(cls, security):
+        return cls(
+            threshold=security.get("failed_attempt_threshold", 2),
+            window=security.get("window_seconds", 60),
+            storm_threshold=security.get("storm_threshold", 20),
+            burst_captures=security.get("burst_captures", 3),
+            digest_interval=security.get("digest_interval_seconds", 60),
+            capture_cooldown=security.get("capture_cooldown_seconds", 10),
+        )
+
+    def _describe(self, account, state):
+        sources = ", ".join(state.ips) if state.ips else "local"
+        return f"{account} (logon type {'/'.join(str(t) for t in sorted(state.logon_types))}, from {sources})"
+
+    def observe(self, failure, now=None):
+        """Feed one failed logon. Returns a list of Capture/Digest decisions."""
+        if now is None:
+            now = time.time()
+        state = self.accounts.get(failure.account)
+        if state is None:
+            state = self.accounts[failure.account] = _AccountState(self.window)
+
+        state.counter.add(now)
+        state.last_seen = now
+        state.logon_types.add(failure.logon_type)
+        if failure.source_ip and failure.source_ip not in state.ips and len(state.ips) < MAX_TRACKED_IPS:
+            state.ips.append(failure.source_ip)
+
+        count = state.counter.count(now)
+        decisions = []
+
+        if state.storm:
+            state.storm_total += 1
+            state.since_digest += 1
+            if now - state.last_digest >= self.digest_interval:
+                decisions.append(self._digest(failure.account, state, now))
+            return decisions
+
+        if count >= self.storm_threshold:
+            # Storm: one capture burst, then digests only
+            state.storm = True
+            state.storm_start = now
+            state.storm_total = count
+            state.since_digest = 0
+            state.last_digest = now
+            state.last_capture = now
+            decisions.append(Capture(failure.account, self.burst_captures, "storm"))
+            decisions.append(Digest(failure.account,
+                f"🚨 Brute-force storm: {count} failed logins for {self._describe(failure.account, state)} "
+                f"in {self.window}s. Digests every {self.digest_interval}s."))
+            return decisions
+
+        if count >= self.threshold and now - state.last_capture >= self.capture_cooldown:
+            state.last_capture = now
+            decisions.append(Capture(failure.account, 1, f"{count} failures in {self.window}s"))
+        return decisions
+
+    def _digest(self, account, state, now):
+        elapsed = max(1, int(now - state.last_digest))
+        text = (f"📊 {state.since_digest} failures for {self._describe(account, state)} in {elapsed}s "
+                f"(storm total {state.storm_total})")
+        state.since_digest = 0
+        state.last_digest = now
+        return Digest(account, text)
+
+    def tick(self, now=None):
+        """Periodic housekeeping: flush digests, end storms, drop idle accounts"""
+        if now is None:
+            now = time.time()
+        decisions = []
+        for account in list(self.accounts):
+            state = self.accounts[account]
+            if state.storm:
+                if state.since_digest and now - state.last_digest >= self.digest_interval:
+                    decisions.append(self._digest(account, state, now))
+                if state.counter.count(now) < self.threshold:
+                    state.storm = False
+                    duration = int(now - state.storm_start)
+                    decisions.append(Digest(account,
+                        f"✅ Storm over for {account}: {state.storm_total} failures in {duration}s"))
+            elif now - state.last_seen > self.window * 2:
+                del self.accounts[account]
+        return decisions
@@ -0,0 +1,371 @@
+import os
+import time
+import json
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# A single Security log record, normalised across backends.
+# inserts = EventData values in schema order (same order as StringInserts)
+LogEvent = namedtuple("LogEvent", ["record_number", "event_id", "time_generated", "inserts"])
+
+EVENT_NS = "{http://schemas.microsoft.com/win/2004/08/events/event}"
+SUBSCRIBE_BATCH = 64
+CATCH_UP_BATCH = 512  # Events per batch when reading a downtime gap
+
+# --------------------------------------------------
+# XML PARSING (EvtRender output)
+# --------------------------------------------------
+def parse_event_xml(xml_text):
+    """Convert an EvtRender XML document into a LogEvent"""
+    root = ET.fromstring(xml_text)
+    system = root.find(f"{EVENT_NS}System")
+
+    event_id = int(system.findtext(f"{EVENT_NS}EventID", "0"))
+    record_number = int(system.findtext(f"{EVENT_NS}EventRecordID", "0"))
+
+    time_generated = time.time()
+    created = system.find(f"{EVENT_NS}TimeCreated")
+    if created is not None and created.get("SystemTime"):
+        # Format: 2026-01-16T10:22:31.1234567Z (7 digit fraction)
+        stamp = created.get("SystemTime").rstrip("Z")
+        if "." in stamp:
+            head, frac = stamp.split(".", 1)
+            stamp = f"{head}.{frac[:6]}"
+        try:
+            fmt = "%Y-%m-%dT%H:%M:%S.%f" if "." in stamp else "%Y-%m-%dT%H:%M:%S"
+            dt = datetime.strptime(stamp, fmt).replace(tzinfo=timezone.utc)
+            time_generated = dt.timestamp()
+        except ValueError:
+            pass
+
+    inserts = tuple((d.text or "") for d in root.iter(f"{EVENT_NS}Data"))
+    return LogEvent(record_number, event_id, time_generated, inserts)
+
+# --------------------------------------------------
+# BACKENDS
+# --------------------------------------------------
+class EventSource:
+    """
+    Base class for Security log sources.
+    read(timeout) blocks until events arrive (or timeout) and returns a list.
+    """
+    name = "base"
+
+    def read(self, timeout):
+        raise NotImplementedError
+
+    def latest_record(self):
+        """Record number read() starts after (bookmark for a first run)"""
+        return 0
+
+    def catch_up(self, after_record, batch=CATCH_UP_BATCH):
+        """
+        Yield lists of about `batch` events logged after `after_record`
+        but before this source started, i.e. while the service was down.
+        Backends without access to history yield nothing.
+        """
+        return iter(())
+
+    def close(self):
+        pass
+
+
+class SubscriptionEventSource(EventSource):
+    """
+    Push backend: EvtSubscribe with a server-side XPath filter.
+    The kernel signals a Win32 event when matching records arrive,
+    so the loop sleeps in WaitForSingleObject instead of polling.
+    """
+    name = "subscribe"
+
+    def __init__(self, event_id, channel="Security"):
+        import win32evtlog
+        import win32event
+        self._evtlog = win32evtlog
+        self._event = win32event
+
+        self.event_id = int(event_id)
+        self.channel = channel
+        self.query = f"*[System[(EventID={self.event_id})]]"
+        # Auto-reset event, set by the Event Log service on new matches
+        self._signal = win32event.CreateEvent(None, 0, 0, None)
+        self._subscription = win32evtlog.EvtSubscribe(
+            channel,
+            win32evtlog.EvtSubscribeToFutureEvents,
+            SignalEvent=self._signal,
+            Query=self.query
+        )
+        # Newest record before the live stream, taken once it is subscribed
+        # so nothing falls in between (an overlap is skipped by record number)
+        self._anchor = self._query_latest()
+
+    def _next(self, handle, count, timeout):
+        """EvtNext, with "no more items" as an empty list"""
+        try:
+            return self._evtlog.EvtNext(handle, count, timeout)
+        except Exception as e:
+            # ERROR_NO_MORE_ITEMS (259) / ERROR_TIMEOUT (1460) mean "empty"
+            if getattr(e, "winerror", None) in (259, 1460):
+                return []
+            raise
+
+    def _render(self, handles):
+        return [parse_event_xml(self._evtlog.EvtRender(h, self._evtlog.EvtRenderEventXml)) for h in handles]
+
+    def _query_latest(self):
+        handle = self._evtlog.EvtQuery(
+            self.channel,
+            self._evtlog.EvtQueryChannelPath | self._evtlog.EvtQueryReverseDirection,
+            self.query
+        )
+        events = self._render(self._next(handle, 1, -1))
+        return events[0].record_number if events else 0
+
+    def latest_record(self):
+        return self._anchor
+
+    def catch_up(self, after_record, batch=CATCH_UP_BATCH):
+        # Server-side filter, one pass forward over the gap; read() has
+        # everything after the anchor
+        query = (f"*[System[(EventID={self.event_id}) and (EventRecordID > {int(after_record)})"
+                 f" and (EventRecordID <= {int(self._anchor)})]]")
+        handle = self._evtlog.EvtQuery(
+            self.channel,
+            self._evtlog.EvtQueryChannelPath | self._evtlog.EvtQueryForwardDirection,
+            query
+        )
+        while True:
+            handles = self._next(handle, batch, -1)
+            if not handles:
+                return
+            yield self._render(handles)
+
+    def _drain(self):
+        events = []
+        while True:
+            handles = self._next(self._subscription, SUBSCRIBE_BATCH, 0)
+            if not handles:
+                return events
+            events += self._render(handles)
+
+    def read(self, timeout):
+        # Anything already queued? (signal may have fired while we were busy)
+        events = self._drain()
+        if events:
+            return events
+
+        rc = self._event.WaitForSingleObject(self._signal, int(timeout * 1000))
+        if rc != self._event.WAIT_OBJECT_0:
+            return []
+        return self._drain()
+
+    def close(self):
+        self._subscription = None
+        self._signal = None
+
+
+class PollingEventSource(EventSource):
+    """
+    Legacy backend: ReadEventLog seek loop.
+    Used when EvtSubscribe is unavailable (old pywin32 / restricted hosts).
+    """
+    name = "poll"
+
+    def __init__(self, event_id, channel="Security", interval=0.5):
+        import win32evtlog
+        self._evtlog = win32evtlog
+        self.event_id = event_id
+        self.channel = channel
+        self.interval = interval
+
+        self._handle = win32evtlog.OpenEventLog("localhost", channel)
+        # Position at the end
+        back_flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
+        events = win32evtlog.ReadEventLog(self._handle, back_flags, 0)
+        self.last_record = events[0].RecordNumber if events else 0
+        self._anchor = self.last_record
+
+    def _to_event(self, record):
+        """EVENTLOGRECORD -> LogEvent, or None if it is another event ID"""
+        # EventID carries facility bits in the high word
+        if (record.EventID & 0xFFFF) != self.event_id:
+            return None
+        try:
+            generated = record.TimeGenerated.timestamp()
+        except Exception:
+            generated = time.time()
+        return LogEvent(
+            record.RecordNumber,
+            record.EventID & 0xFFFF,
+            generated,
+            tuple(record.StringInserts or ())
+        )
+
+    def latest_record(self):
+        return self._anchor
+
+    def catch_up(self, after_record, batch=CATCH_UP_BATCH):
+        position = after_record + 1
+        try:
+            # The log wrapped past the bookmark: start at what is left
+            position = max(position, self._evtlog.GetOldestEventLogRecord(self._handle))
+        except Exception:
+            pass
+        flags = self._evtlog.EVENTLOG_FORWARDS_READ | self._evtlog.EVENTLOG_SEEK_READ
+        events = []
+        done = False
+        # Everything up to the anchor; read() takes over after it
+        while not done and position <= self._anchor:
+            records = self._evtlog.ReadEventLog(self._handle, flags, position)
+            if not records:
+                break
+            for record in records:
+                if record.RecordNumber > self._anchor:
+                    done = True
+                    break
+                position = record.RecordNumber + 1
+                event = self._to_event(record)
+                if event is not None:
+                    events.append(event)
+            if len(events) >= batch:
+                yield events
+                events = []
+        if events:
+            yield events
+
+    def read(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            flags = self._evtlog.EVENTLOG_FORWARDS_READ | self._evtlog.EVENTLOG_SEEK_READ
+            records = self._evtlog.ReadEventLog(self._handle, flags, self.last_record)
+
+            events = []
+            for record in records or []:
+                if record.RecordNumber <= self.last_record:
+                    continue
+                self.last_record = record.RecordNumber
+                event = self._to_event(record)
+                if event is not None:
+                    events.append(event)
+
+            if events or time.time() >= deadline:
+                return events
+            time.sleep(self.interval)
+
+    def close(self):
+        try:
+            self._evtlog.CloseEventLog(self._handle)
+        except Exception:
+            pass
+
+
+class ReplayEventSource(EventSource):
+    """
+    File backend: replays recorded events (JSON lines) with their original
+    spacing. Each line: {"offset": 1.25, "record_number": 10, "event_id": 4625,
+    "inserts": [...]}. time_generated is stamped with the scheduled emit time,
+    so (detection time - time_generated) is the pipeline's detection latency.
+    Records with a negative offset were logged before the source opened
+    (service downtime): read() skips them, catch_up() returns them.
+    Works on any OS - used to measure latency on Linux.
+    """
+    name = "replay"
+
+    def __init__(self, path, event_id=None, speed=1.0):
+        self.path = path
+        self.event_id = event_id
+        self.speed = speed if speed > 0 else 1.0
+        self.records = []
+        self.exhausted = False
+
+        with open(path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                raw = json.loads(line)
+                self.records.append((
+                    float(raw.get("offset", 0.0)),
+                    int(raw.get("record_number", i + 1)),
+                    int(raw.get("event_id", 0)),
+                    tuple(raw.get("inserts", ()))
+                ))
+        self.records.sort(key=lambda r: r[0])
+        split = next((i for i, r in enumerate(self.records) if r[0] >= 0), len(self.records))
+        self.history, self.records = self.records[:split], self.records[split:]
+        self._pos = 0
+        self._start = time.time()
+
+    def latest_record(self):
+        return max((r[1] for r in self.history), default=0)
+
+    def catch_up(self, after_record, batch=CATCH_UP_BATCH):
+        events = []
+        for offset, record_number, event_id, inserts in self.history:
+            if record_number <= after_record:
+                continue
+            if self.event_id is not None and event_id != self.event_id:
+                continue
+            events.append(LogEvent(record_number, event_id, self._start + offset / self.speed, inserts))
+            if len(events) >= batch:
+                yield events
+                events = []
+        if events:
+            yield events
+
+    def read(self, timeout):
+        deadline = time.time() + timeout
+        while self._pos < len(self.records):
+            offset = self.records[self._pos][0]
+            due = self._start + offset / self.speed
+            now = time.time()
+            if due > now:
+                if due > deadline:
+                    time.sleep(max(0.0, deadline - now))
+                    return []
+                time.sleep(due - now)
+
+            # Emit everything that is due
+            events = []
+            now = time.time()
+            while self._pos < len(self.records):
+                offset, record_number, event_id, inserts = self.records[self._pos]
+                due = self._start + offset / self.speed
+                if due > now:
+                    break
+                self._pos += 1
+                # Emulate the server-side XPath filter
+                if self.event_id is not None and event_id != self.event_id:
+                    continue
+                events.append(LogEvent(record_number, event_id, due, inserts))
+            if events:
+                return events
+
+        self.exhausted = True
+        return []
+
+# --------------------------------------------------
+# FACTORY
+# --------------------------------------------------
+def open_event_source(security_config, event_id):
+    """
+    Build the configured backend. security_config keys:
+      event_source: "subscribe" (default) | "poll" | "replay"
+      replay_file / replay_speed: for the replay backend
+      check_interval_seconds: poll backend interval
+    """
+    backend = security_config.get("event_source", "subscribe")
+
+    if backend == "replay":
+        path = security_config.get("replay_file") or os.getenv("WATCHDOG_REPLAY_FILE")
+        return ReplayEventSource(path, event_id, security_config.get("replay_speed", 1.0))
+
+    if backend == "subscribe":
+        try:
+            return SubscriptionEventSource(event_id)
+        except Exception as e:
+            print(f"[WARN] EvtSubscribe unavailable ({e}), falling back to polling")
+
+    interval = security_config.get("check_interval_seconds", 0.5)
+    return PollingEventSource(event_id, interval=min(interval, 0.5))
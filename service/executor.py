@@ -0,0 +1,117 @@
+import time
+import threading
+import itertools
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+class CommandExecutor:
+    """
+    Fixed-size worker pool for commander commands.
+    - priority: lower value runs first (e.g. /lock before /stat)
+    - resources: per-command resource name with a concurrency limit
+      (e.g. one camera user at a time); a worker skips queued commands
+      whose resource is busy instead of blocking on it
+    - identical commands already queued or running are de-duplicated
+    """
+    def __init__(self, handler, workers=3, priorities=None, resources=None, limits=None, default_priority=5):
+        self.handler = handler
+        self.priorities = priorities or {}
+        self.resources = resources or {}
+        self.limits = limits or {}
+        self.default_priority = default_priority
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._pending = []     # (priority, seq, enqueued_at, text, key)
+        self._inflight = set()  # dedupe keys, queued or running
+        self._busy = {}         # resource -> running count
+
+        self.metrics = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_depth": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+        self._workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"cmd-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    @staticmethod
+    def action_of(text):
+        parts = text.lower().strip().split()
+        return parts[0] if parts else ""
+
+    def submit(self, text):
+        """Queue a command. Returns False if an identical one is in flight."""
+        key = " ".join(text.lower().split())
+        action = self.action_of(text)
+        priority = self.priorities.get(action, self.default_priority)
+
+        with self._cond:
+            if key in self._inflight:
+                self.metrics["deduplicated"] += 1
+                return False
+            self._inflight.add(key)
+            self._pending.append((priority, next(self._seq), time.time(), text, key))
+            self._pending.sort()
+            self.metrics["submitted"] += 1
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], len(self._pending))
+            self._cond.notify()
+        return True
+
+    def _runnable(self):
+        """Pop the best pending command whose resource has capacity"""
+        for i, entry in enumerate(self._pending):
+            resource = self.resources.get(self.action_of(entry[3]))
+            if resource and self._busy.get(resource, 0) >= self.limits.get(resource, 1):
+                continue
+            del self._pending[i]
+            if resource:
+                self._busy[resource] = self._busy.get(resource, 0) + 1
+            return entry, resource
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                entry, resource = self._runnable()
+                while entry is None:
+                    self._cond.wait()
+                    entry, resource = self._runnable()
+                waited = time.time() - entry[2]
+                self.metrics["wait_total"] += waited
+                self.metrics["wait_max"] = max(self.metrics["wait_max"], waited)
+            perf.observe("cmd_queue_wait", waited * 1000)
+
+            ok = True
+            try:
+                self.handler(entry[3])
+            except Exception as e:
+                ok = False
+                print(f"[ERROR] Command {entry[3]!r} failed: {e}")
+
+            with self._cond:
+                self._inflight.discard(entry[4])
+                if resource:
+                    self._busy[resource] -= 1
+                self.metrics["completed" if ok else "failed"] += 1
+                # A freed resource may unblock a queued command
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            result = dict(self.metrics)
+            result["queue_depth"] = len(self._pending)
+            result["running"] = len(self._inflight) - len(self._pending)
+            done = result["completed"] + result["failed"]
+            result["wait_avg"] = result["wait_total"] / done if done else 0.0
+        return result
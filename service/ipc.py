@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+IPC_PIPE_NAME = r"\\.\pipe\WatchDogIPC"
+IPC_SOCKET_NAME = "watchdog.sock"
+# SYSTEM full control, interactively logged-on users read/write, nobody
+# else. Generic write includes FILE_CREATE_PIPE_INSTANCE on a pipe; the
+# single-instance limit is what keeps a second server off our name.
+IPC_PIPE_SDDL = "D:P(A;;GA;;;SY)(A;;GRGW;;;IU)"
+PIPE_REJECT_REMOTE_CLIENTS = 0x8
+PIPE_BUFSIZE = 8192
+
+def default_address(run_dir):
+    """Named pipe on Windows, Unix socket (in run_dir) elsewhere"""
+    if sys.platform == "win32":
+        return IPC_PIPE_NAME
+    return os.path.join(run_dir, IPC_SOCKET_NAME)
+
+def is_pipe(address):
+    return address.startswith("\\\\.\\pipe\\")
+
+def authkey_from_token(bot_token):
+    """Both processes read the same config; derive the HMAC key from it"""
+    return hashlib.sha256(f"watchdog-ipc:{bot_token}".encode()).digest()
+
+# --------------------------------------------------
+# WIRE FORMAT
+# --------------------------------------------------
+# Every message is a JSON header frame, optionally followed by one raw
+# bytes frame (header["payload"] = True). No pickle: the service runs as
+# SYSTEM and must never unpickle data from a user-session process.
+def send_message(conn, header, payload=None):
+    header = dict(header, payload=payload is not None)
+    conn.send_bytes(json.dumps(header).encode())
+    if payload is not None:
+        conn.send_bytes(payload)
+
+def recv_message(conn):
+    header = json.loads(conn.recv_bytes().decode())
+    payload = conn.recv_bytes() if header.get("payload") else None
+    return header, payload
+
+# --------------------------------------------------
+# LISTENING END (SERVICE)
+# --------------------------------------------------
+class SecurePipeListener:
+    """
+    Named pipe server end created with IPC_PIPE_SDDL instead of the
+    default DACL (multiprocessing's Listener can't set one). Each instance
+    is created with FILE_FLAG_FIRST_PIPE_INSTANCE and a single-instance
+    limit, so if another process already owns the name, creation fails
+    rather than joining its pipe. accept() runs the same authkey handshake
+    as Listener and returns a multiprocessing Connection.
+    """
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._handle = self._create()
+
+    def _create(self):
+        import _winapi
+        import pywintypes
+        import win32pipe
+        import win32security
+        attributes = pywintypes.SECURITY_ATTRIBUTES()
+        attributes.SECURITY_DESCRIPTOR = win32security.ConvertStringSecurityDescriptorToSecurityDescriptor(
+            IPC_PIPE_SDDL, win32security.SDDL_REVISION_1)
+        handle = win32pipe.CreateNamedPipe(
+            self.address,
+            _winapi.PIPE_ACCESS_DUPLEX | _winapi.FILE_FLAG_OVERLAPPED | _winapi.FILE_FLAG_FIRST_PIPE_INSTANCE,
+            _winapi.PIPE_TYPE_MESSAGE | _winapi.PIPE_READMODE_MESSAGE | _winapi.PIPE_WAIT
+            | PIPE_REJECT_REMOTE_CLIENTS,
+            1, PIPE_BUFSIZE, PIPE_BUFSIZE, 0, attributes
+        )
+        # Plain handle for _winapi / PipeConnection from here on
+        return handle.Detach()
+
+    def accept(self):
+        import _winapi
+        from multiprocessing.connection import PipeConnection, deliver_challenge, answer_challenge
+        handle, self._handle = self._handle, None
+        if handle is None:
+            # The previous link closed its instance; make a new one
+            handle = self._create()
+        try:
+            ov = _winapi.ConnectNamedPipe(handle, overlapped=True)
+        except OSError as e:
+            # ERROR_NO_DATA: a client connected and left already
+            if e.winerror != _winapi.ERROR_NO_DATA:
+                _winapi.CloseHandle(handle)
+                raise
+        else:
+            ov.GetOverlappedResult(True)  # Blocks until a client connects
+        conn = PipeConnection(handle)
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def close(self):
+        if self._handle is not None:
+            import _winapi
+            _winapi.CloseHandle(self._handle)
+            self._handle = None
+
+def listen(address, authkey):
+    """Server end for the service: a locked-down pipe on Windows, else a Unix socket"""
+    if is_pipe(address):
+        return SecurePipeListener(address, authkey)
+    from multiprocessing.connection import Listener
+    if os.path.exists(address):
+        os.remove(address)  # Stale socket from a previous run
+    listener = Listener(address, authkey=authkey)
+    # The commander runs as the user; the authkey handshake gates it
+    os.chmod(address, 0o666)
+    return listener
+
+# --------------------------------------------------
+# COMMANDER SIDE
+# --------------------------------------------------
+class CaptureBroker:
+    """
+    Commander side. Keeps connecting to the service's pipe/socket (the
+    service may start later, or restart) and forwards capture requests
+    to it, so only the service opens the webcam and loads cv2. The
+    listening end belongs to SYSTEM, not to this user-session process.
+    """
+    def __init__(self, address, authkey, retry_interval=5):
+        self.address = address
+        self.authkey = authkey
+        self.retry_interval = retry_interval
+        self._conn = None
+        self._lock = threading.Lock()  # One request in flight per connection
+        self._seq = 0
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._connect_loop, name="ipc-connect", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _connect_loop(self):
+        from multiprocessing.connection import Client
+        while not self._stop.is_set():
+            if self._conn is not None:
+                self._check_link()
+            if self._conn is None:
+                try:
+                    conn = Client(self.address, authkey=self.authkey)
+                except Exception:
+                    # Service not running (yet), or a failed handshake
+                    self._stop.wait(self.retry_interval)
+                    continue
+                with self._lock:
+                    self._conn = conn
+                print("[*] Connected to the service over IPC")
+                try:
+                    rtt = self.request("ping", timeout=5)[0].get("rtt_ms")
+                    print(f"[*] IPC round trip {rtt:.2f} ms")
+                except Exception:
+                    pass
+            self._stop.wait(self.retry_interval)
+
+    def _check_link(self):
+        """Drop a link the service closed while idle (it never sends unasked)"""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                closed = self._conn.poll(0)
+            except (OSError, EOFError):
+                closed = True
+            if closed:
+                print("[*] Service IPC link closed")
+                self._drop()
+
+    def _drop(self):
+        self._conn.close()
+        self._conn = None
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    def request(self, op, timeout=30, **args):
+        """Send one request; returns (header, payload). Raises if unavailable."""
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                raise ConnectionError("Service not connected")
+            self._seq += 1
+            start = time.perf_counter()
+            try:
+                send_message(conn, {"id": self._seq, "op": op, "args": args})
+                if not conn.poll(timeout):
+                    raise TimeoutError(f"IPC {op} timed out")
+                header, payload = recv_message(conn)
+            except (OSError, EOFError, TimeoutError):
+                # The service restarted or hung: drop the link, we reconnect
+                self._drop()
+                raise
+            rtt_ms = (time.perf_counter() - start) * 1000
+        perf.observe(f"ipc_{op}", rtt_ms)
+        header["rtt_ms"] = rtt_ms
+        if not header.get("ok"):
+            raise RuntimeError(header.get("error", f"IPC {op} failed"))
+        return header, payload
+
+# --------------------------------------------------
+# SERVICE SIDE
+# --------------------------------------------------
+class CaptureAgent:
+    """
+    Service side. Owns the listening pipe/socket (see listen()), accepts
+    one commander at a time and answers its requests with handlers:
+    handlers[op](args) -> (header dict, payload bytes or None).
+    """
+    def __init__(self, address, authkey, handlers, retry_interval=5):
+        self.address = address
+        self.authkey = authkey
+        self.handlers = dict(handlers)
+        self.handlers.setdefault("ping", lambda args: ({}, None))
+        self.retry_interval = retry_interval
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._loop, name="ipc-agent", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        listener = None
+        while not self._stop.is_set():
+            try:
+                if listener is None:
+                    listener = listen(self.address, self.authkey)
+                    print(f"[*] IPC listening on {self.address}")
+                conn = listener.accept()
+            except Exception as e:
+                # Name already taken by another process, or a failed
+                # handshake (wrong authkey)
+                print(f"[ERROR] IPC accept failed: {e}")
+                self._stop.wait(self.retry_interval)
+                continue
+            print("[*] Commander connected over IPC")
+            try:
+                self._serve(conn)
+            except (OSError, EOFError):
+                print("[*] Commander IPC link closed")
+            finally:
+                conn.close()
+
+    def _serve(self, conn):
+        while not self._stop.is_set():
+            header, _ = recv_message(conn)
+            op = header.get("op")
+            handler = self.handlers.get(op)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown op {op!r}")
+                with perf.span(f"ipc_serve_{op}"):
+                    reply, payload = handler(header.get("args") or {})
+                reply = dict(reply, id=header.get("id"), ok=reply.get("ok", True))
+            except Exception as e:
+                reply, payload = {"id": header.get("id"), "ok": False, "error": str(e)}, None
+            send_message(conn, reply, payload)
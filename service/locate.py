@@ -0,0 +1,220 @@
+import re
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+GEO_URL = "http://ip-api.com/json/"
+
+# --------------------------------------------------
+# NETSH PARSER
+# --------------------------------------------------
+_SSID_RE = re.compile(r"^SSID\s+\d+\s*:\s?(.*)$")
+_BSSID_RE = re.compile(r"^BSSID\s+\d+\s*:\s*([0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5})\s*$")
+_SIGNAL_RE = re.compile(r"^(\d{1,3})\s*%$")
+# "Channel" is translated on localized Windows
+CHANNEL_KEYS = {"channel", "kanal", "canal", "canale", "kanaal"}
+
+def parse_netsh_networks(output):
+    """
+    `netsh wlan show networks mode=bssid` -> one record per access point:
+    {"ssid", "bssid", "signal" (percent), "channel"}, strongest first.
+    Hidden networks get ssid "". Lines of unknown shape are ignored.
+    """
+    records = []
+    ssid = ""
+    current = None
+    for raw in output.splitlines():
+        line = raw.strip()
+        match = _SSID_RE.match(line)
+        if match:
+            ssid = match.group(1).strip()
+            current = None
+            continue
+        match = _BSSID_RE.match(line)
+        if match:
+            current = {"ssid": ssid, "bssid": match.group(1).lower(), "signal": 0, "channel": None}
+            records.append(current)
+            continue
+        if current is None or ":" not in line:
+            continue
+        key, value = (part.strip() for part in line.split(":", 1))
+        match = _SIGNAL_RE.match(value)
+        if match:
+            current["signal"] = int(match.group(1))
+        elif key.lower() in CHANNEL_KEYS and value.isdigit():
+            current["channel"] = int(value)
+    records.sort(key=lambda r: r["signal"], reverse=True)
+    return records
+
+def scan_wifi():
+    """Visible access points (Windows WLAN service)"""
+    import subprocess
+    if sys.platform != "win32":
+        raise RuntimeError("WiFi scan needs Windows (netsh)")
+    si = subprocess.STARTUPINFO()
+    si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    output = subprocess.check_output(
+        ["netsh", "wlan", "show", "networks", "mode=bssid"],
+        startupinfo=si,
+        encoding="utf-8",
+        errors="ignore",
+        timeout=15
+    )
+    return parse_netsh_networks(output)
+
+def geo_ip(transport):
+    info = transport.get(GEO_URL, timeout=10).json()
+    if info.get("status") != "success":
+        raise RuntimeError(info.get("message", "lookup failed"))
+    return info
+
+# --------------------------------------------------
+# CACHED, CONCURRENT LOOKUP
+# --------------------------------------------------
+class Locator:
+    """
+    /locate backend. The WiFi scan and the geo-IP lookup run concurrently,
+    and each result is cached for its own TTL (APs change as the laptop
+    moves; the public IP rarely does), so a repeated /locate is answered
+    from memory. Every fresh scan is diffed against the previous one.
+    """
+    def __init__(self, transport, wifi_ttl=60, geo_ttl=600, scanner=scan_wifi, geo=None):
+        self.wifi_ttl = wifi_ttl
+        self.geo_ttl = geo_ttl
+        self.scanner = scanner
+        self.geo = geo or (lambda: geo_ip(transport))
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="locate")
+        self._lock = threading.Lock()  # One refresh at a time; others get its result
+        self._wifi = None    # (timestamp, records)
+        self._geo = None     # (timestamp, info)
+        self._delta = {"appeared": [], "disappeared": []}
+
+    @classmethod
+    def from_config(cls, transport, config):
+        return cls(
+            transport,
+            wifi_ttl=config.get("wifi_ttl_seconds", 60),
+            geo_ttl=config.get("geo_ttl_seconds", 600),
+        )
+
+    @staticmethod
+    def _fresh(entry, ttl, now):
+        return entry is not None and now - entry[0] < ttl
+
+    def cached(self):
+        """True if locate() would be answered from memory"""
+        now = time.time()
+        return self._fresh(self._wifi, self.wifi_ttl, now) and self._fresh(self._geo, self.geo_ttl, now)
+
+    def _scan(self):
+        with perf.span("locate_wifi"):
+            return self.scanner()
+
+    def _lookup(self):
+        with perf.span("locate_geo"):
+            return self.geo()
+
+    def _update_wifi(self, records, now):
+        if self._wifi is not None:
+            before = {r["bssid"]: r for r in self._wifi[1]}
+            after = {r["bssid"]: r for r in records}
+            self._delta = {
+                "appeared": [r for r in records if r["bssid"] not in before],
+                "disappeared": [r for b, r in before.items() if b not in after],
+            }
+        self._wifi = (now, records)
+
+    def locate(self, force=False):
+        """
+        {"wifi": records, "geo": info, "delta": {...}, "wifi_age": s,
+         "geo_age": s, "wifi_error": str, "geo_error": str}
+        """
+        with self._lock:
+            now = time.time()
+            jobs = {}
+            if force or not self._fresh(self._wifi, self.wifi_ttl, now):
+                jobs["wifi"] = self._pool.submit(self._scan)
+            if force or not self._fresh(self._geo, self.geo_ttl, now):
+                jobs["geo"] = self._pool.submit(self._lookup)
+
+            errors = {}
+            for name, job in jobs.items():
+                try:
+                    value = job.result()
+                except Exception as e:
+                    errors[name] = str(e)
+                    continue
+                # TTLs run from when the data was collected
+                if name == "wifi":
+                    self._update_wifi(value, time.time())
+                else:
+                    self._geo = (time.time(), value)
+            if not jobs:
+                perf.incr("locate_cache_hits")
+
+            now = time.time()
+
+            return {
+                "wifi": self._wifi[1] if self._wifi else [],
+                "geo": self._geo[1] if self._geo else None,
+                "delta": self._delta,
+                "wifi_age": now - self._wifi[0] if self._wifi else None,
+                "geo_age": now - self._geo[0] if self._geo else None,
+                "wifi_error": errors.get("wifi"),
+                "geo_error": errors.get("geo"),
+            }
+
+# --------------------------------------------------
+# REPORT
+# --------------------------------------------------
+def _ap_line(record):
+    channel = f", ch {record['channel']}" if record["channel"] else ""
+    return f"📶 {record['ssid'] or '(hidden)'}\n   `{record['bssid']}` ({record['signal']}%{channel})"
+
+def _age(seconds):
+    return f"{seconds:.0f}s ago" if seconds < 90 else f"{seconds / 60:.0f} min ago"
+
+def format_report(result, max_networks=8):
+    info = result["geo"]
+    lines = ["📍 *Detailed Location Report*", "--------------------------------"]
+    if info:
+        map_link = f"https://maps.google.com/?q={info['lat']},{info['lon']}"
+        lines += [
+            "🌍 *IP-Based Info*:",
+            f"   City: {info.get('city')}",
+            f"   ISP: {info.get('isp')}",
+            f"   IP: {info.get('query')}",
+            f"   🔗 [Google Maps]({map_link})",
+        ]
+        if (result["geo_age"] or 0) >= 1:
+            lines.append(f"   _(cached, {_age(result['geo_age'])})_")
+    else:
+        lines.append(f"❌ Geo-IP Failed: {result['geo_error']}")
+    lines.append("")
+
+    wifi = result["wifi"]
+    header = "📡 *Nearby WiFi (Triangulation Data)*"
+    if (result["wifi_age"] or 0) >= 1:
+        header += f" _(scanned {_age(result['wifi_age'])})_"
+    lines.append(header + ":")
+    if wifi:
+        lines += [_ap_line(r) for r in wifi[:max_networks]]
+        if len(wifi) > max_networks:
+            lines.append(f"   … {len(wifi) - max_networks} weaker")
+    else:
+        lines.append(f"Scan Error: {result['wifi_error']}" if result["wifi_error"] else "No WiFi networks found.")
+
+    delta = result["delta"]
+    if delta["appeared"] or delta["disappeared"]:
+        lines += ["", "🔄 *Since the previous scan*:"]
+        lines += [f"   ➕ {r['ssid'] or '(hidden)'} `{r['bssid']}` ({r['signal']}%)" for r in delta["appeared"][:max_networks]]
+        lines += [f"   ➖ {r['ssid'] or '(hidden)'} `{r['bssid']}`" for r in delta["disappeared"][:max_networks]]
+
+    lines += ["", "_Copy BSSIDs to Wigle.net for precise coord_"]
+    return "\n".join(lines)
@@ -1,16 +1,9 @@
 import os
 import time
 import json
-import win32evtlog
 import threading
 import sys
-try:
-    import win32gui
-    import win32con
-except ImportError:
-    win32gui = None
-    win32con = None
-import requests
+from contextlib import ExitStack
 
 # Ensure root directory is in path for imports
 if not getattr(sys, 'frozen', False):
@@ -19,10 +12,34 @@ if not getattr(sys, 'frozen', False):
 # Import new modules
 try:
     # Try local import (if running from inside service dir)
-    from camera import capture_intruder_file
+    from camera import capture_best_bytes, save_capture_bytes, get_session, record_clip
+    import camera
+    from eventsource import open_event_source
+    from outbox import Outbox, OUTBOX_DB_NAME, PRIORITY_ALERT, PRIORITY_BACKLOG
+    from transport import get_transport
+    from sampler import MetricsSampler, METRICS_FILE_NAME
+    from detector import BruteForceDetector, Capture, parse_failed_logon
+    from motion import MotionDetector, MotionWatch
+    from dedup import DedupCache
+    from ipc import CaptureAgent, default_address, authkey_from_token
+    from backlog import OffsetStore
+    from perf import PerfExporter, StartupTimer, PERF_FILE_NAME, COMMANDER_PERF_FILE_NAME
+    import perf
 except ImportError:
     # Try package import (if running from root or exe)
-    from service.camera import capture_intruder_file
+    from service.camera import capture_best_bytes, save_capture_bytes, get_session, record_clip
+    import service.camera as camera
+    from service.eventsource import open_event_source
+    from service.outbox import Outbox, OUTBOX_DB_NAME, PRIORITY_ALERT, PRIORITY_BACKLOG
+    from service.transport import get_transport
+    from service.sampler import MetricsSampler, METRICS_FILE_NAME
+    from service.detector import BruteForceDetector, Capture, parse_failed_logon
+    from service.motion import MotionDetector, MotionWatch
+    from service.dedup import DedupCache
+    from service.ipc import CaptureAgent, default_address, authkey_from_token
+    from service.backlog import OffsetStore
+    from service.perf import PerfExporter, StartupTimer, PERF_FILE_NAME, COMMANDER_PERF_FILE_NAME
+    import service.perf as perf
 
 # --------------------------------------------------
 # PATHS (SERVICE SAFE)
@@ -46,8 +63,16 @@ if not os.path.exists(CAPTURES_DIR):
     except Exception as e:
         print(f"[ERROR] Could not create capture dir: {e}")
 
-CAPTURE_COOLDOWN = 0.0  # Zero delay between possible captures
-last_capture_time = 0
+OUTBOX_PATH = os.path.join(CAPTURES_DIR, OUTBOX_DB_NAME)
+OUTBOX_BATCH = 10
+MEDIA_GROUP_MAX = 10  # Telegram limit per sendMediaGroup
+MAX_CAPTION = 1024
+OUTBOX_IDLE_WAIT = 30  # Re-check the db for items queued by the commander process
+ALERT_MAX_WAIT = 5  # Longer rate-limit waits hand a live alert over to the outbox
+ALERT_CAPTION = "🚨 Wrong PIN attempt detected!"
+CLIP_CAPTION = "🎥 Intruder clip"
+MOTION_CAPTION = "👀 Motion detected while locked!"
+outbox = None  # Created in start_service
 
 # --------------------------------------------------
 # LOAD CONFIG (SAFE)
@@ -63,157 +88,554 @@ BOT_TOKEN = CONFIG.get("telegram", {}).get("bot_token")
 CHAT_ID = CONFIG.get("telegram", {}).get("chat_id")
 
 # Security
-FAILED_THRESHOLD = CONFIG.get("security", {}).get("failed_attempt_threshold", 2)
 TARGET_EVENT_ID = CONFIG.get("security", {}).get("event_id", 4625)
-CHECK_INTERVAL = CONFIG.get("security", {}).get("check_interval_seconds", 0.1)
+EVENT_WAIT_TIMEOUT = 5.0  # Max sleep between stop checks (events wake us earlier)
+# Last processed record, so failures logged while we were down are not lost
+BOOKMARK_PATH = os.path.join(CAPTURES_DIR, "eventlog_bookmark.json")
+BOOKMARK_SAVE_INTERVAL = 2  # A crash re-reads at most this much of the log
+CATCH_UP = CONFIG.get("security", {}).get("catch_up", True)
+CATCH_UP_BATCH = CONFIG.get("security", {}).get("catch_up_batch", 512)
 
 # Camera
 CAM_INDEX = CONFIG.get("camera", {}).get("device_index", 0)
+CAM_KEEP_WARM = CONFIG.get("camera", {}).get("keep_warm", True)
+CAM_IDLE_TIMEOUT = CONFIG.get("camera", {}).get("idle_timeout_seconds", 20)
+IN_MEMORY_UPLOAD = CONFIG.get("camera", {}).get("in_memory_upload", True)
+# Burst capture: grab N frames, send the best M (sharpness x exposure)
+BURST_FRAMES = CONFIG.get("camera", {}).get("burst_frames", 5)
+BURST_TOP = CONFIG.get("camera", {}).get("burst_top", 1)
+# Alert policy: also record a short clip after the stills (0 = stills only)
+ALERT_CLIP_SECONDS = CONFIG.get("camera", {}).get("alert_clip_seconds", 0)
+CLIP_FPS = CONFIG.get("camera", {}).get("clip_fps", 10)
+CLIP_WIDTH = CONFIG.get("camera", {}).get("clip_width", 320)
+CLIP_SEGMENT_SECONDS = CONFIG.get("camera", {}).get("clip_segment_seconds", 5)
+
+camera_session = get_session(CAM_INDEX, idle_timeout=CAM_IDLE_TIMEOUT)
+
+# Armed watch: motion-triggered captures while the workstation is locked
+MOTION_WATCH = CONFIG.get("camera", {}).get("motion_watch", False)
+motion_watch = None  # Created on first lock
+
+# Metrics history (read by the commander's /stat 1h)
+METRICS_INTERVAL = CONFIG.get("metrics", {}).get("interval_seconds", 60)
+METRICS_HISTORY = CONFIG.get("metrics", {}).get("history_size", 1440)
+
+# Hot-path timings (read by the commander's /perf, optional Prometheus export)
+PERF_INTERVAL = CONFIG.get("perf", {}).get("export_interval_seconds", 30)
+PERF_PROM_FILE = CONFIG.get("perf", {}).get("prometheus_file")
+PERF_PROM_PORT = CONFIG.get("perf", {}).get("prometheus_port", 0)
+
+# Near-duplicate suppression in front of every photo upload
+dedup = DedupCache.from_config(CONFIG.get("dedup", {}))
+
+# Network (shared keep-alive pool, also used by the commander).
+# requests is only imported on first use or by the prewarm thread.
+transport = get_transport(CONFIG)
+connectivity = transport.connectivity
+
+# Fast start: the event monitor is armed first; cv2 and the HTTP stack
+# load in a background thread instead of on the first alert
+PREWARM = CONFIG.get("startup", {}).get("prewarm", True)
+STARTUP = StartupTimer()
+monitor_armed = threading.Event()
 
 # --------------------------------------------------
 # UPLOAD WORKER (QUEUE HANDLER)
 # --------------------------------------------------
-def check_internet():
-    try:
-        import requests
-        requests.get("https://www.google.com", timeout=1)
+def send_result(resp):
+    """
+    True if Telegram accepted the send, False if it may succeed later,
+    None if it was rejected for good (4xx other than 429: bad file,
+    chat not found, ...) and retrying is pointless.
+    """
+    if resp.status_code == 200:
         return True
-    except:
+    if 400 <= resp.status_code < 500 and resp.status_code != 429:
+        try:
+            reason = resp.json().get("description")
+        except Exception:
+            reason = None
+        print(f"[ERROR] Telegram rejected the upload ({resp.status_code}): {reason}")
+        return None
+    return False
+
+def send_telegram_photo(image, caption=ALERT_CAPTION, priority=PRIORITY_ALERT, max_wait=None):
+    """image: file path, or JPEG bytes already encoded in memory"""
+    if not BOT_TOKEN or not CHAT_ID:
+        return False
+
+    image_hash = None
+    if dedup is not None:
+        image_hash = dedup.hash(image)
+        if dedup.check(image_hash):
+            print("[INFO] Near-duplicate of a recent upload, suppressed")
+            return True
+        caption = (caption + dedup.note())[:MAX_CAPTION]
+
+    data = {"chat_id": CHAT_ID, "caption": caption}
+
+    try:
+        if isinstance(image, (bytes, bytearray)):
+            files = {"photo": ("capture.jpg", image, "image/jpeg")}
+            resp = transport.call("sendPhoto", data=data, files=files, priority=priority, max_wait=max_wait)
+        else:
+            with open(image, "rb") as img:
+                files = {"photo": img}
+                resp = transport.call("sendPhoto", data=data, files=files, priority=priority, max_wait=max_wait)
+        result = send_result(resp)
+        if result and dedup is not None:
+            dedup.record(image_hash)
+        return result
+    except Exception as e:
+        print(f"[DEBUG] Upload failed: {e}")
         return False
 
-def send_telegram_photo(image_path):
+def send_telegram_video(path, caption=CLIP_CAPTION, priority=PRIORITY_ALERT):
     if not BOT_TOKEN or not CHAT_ID:
         return False
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
-    data = {"chat_id": CHAT_ID, "caption": "🚨 Wrong PIN attempt detected! (Buffered Image)"}
+    try:
+        with open(path, "rb") as video:
+            resp = transport.call(
+                "sendVideo",
+                data={"chat_id": CHAT_ID, "caption": caption, "supports_streaming": "true"},
+                files={"video": video},
+                priority=priority
+            )
+        return send_result(resp)
+    except Exception as e:
+        print(f"[DEBUG] Video upload failed: {e}")
+        return False
+
+def send_telegram_text(text, priority=PRIORITY_ALERT):
+    if not BOT_TOKEN or not CHAT_ID:
+        return False
 
     try:
-        import requests
-        with open(image_path, "rb") as img:
-            files = {"photo": img}
-            resp = requests.post(url, data=data, files=files, timeout=20)
-            return resp.status_code == 200
+        resp = transport.call("sendMessage", json={"chat_id": CHAT_ID, "text": text}, priority=priority)
+        return send_result(resp)
     except Exception as e:
-        print(f"[DEBUG] Upload failed: {e}")
+        print(f"[DEBUG] Message failed: {e}")
         return False
 
+def send_telegram_album(items):
+    """Upload up to 10 queued photos as one sendMediaGroup request"""
+    if not BOT_TOKEN or not CHAT_ID:
+        return False
+
+    media = []
+    for i, item in enumerate(items):
+        entry = {"type": "photo", "media": f"attach://photo{i}"}
+        if i == 0:
+            # Telegram shows the first item's caption for the whole album
+            entry["caption"] = album_caption(items, dedup.note() if dedup else "")
+        media.append(entry)
+
+    try:
+        with ExitStack() as stack:
+            files = {
+                f"photo{i}": stack.enter_context(open(item.path, "rb"))
+                for i, item in enumerate(items)
+            }
+            data = {"chat_id": CHAT_ID, "media": json.dumps(media)}
+            # An album counts as one message per photo against the limits
+            resp = transport.call(
+                "sendMediaGroup", data=data, files=files,
+                priority=min(item.priority for item in items), cost=len(items)
+            )
+            return send_result(resp)
+    except Exception as e:
+        print(f"[DEBUG] Album upload failed: {e}")
+        return False
+
+def album_caption(items, note=""):
+    """One combined caption with a capture timestamp per photo"""
+    lines = [f"{items[0].caption or ALERT_CAPTION} ({len(items)} captures){note}"]
+    for i, item in enumerate(items, 1):
+        lines.append(f"#{i} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item.created))}")
+    return "\n".join(lines)[:MAX_CAPTION]
+
+def group_items(items):
+    """Coalesce consecutive photos into album-sized batches; texts go alone"""
+    batches = []
+    for item in items:
+        if (item.kind == "photo" and batches and batches[-1][0].kind == "photo"
+                and len(batches[-1]) < MEDIA_GROUP_MAX):
+            batches[-1].append(item)
+        else:
+            batches.append([item])
+    return batches
+
+def deliver(item):
+    """
+    Send one outbox item. Returns True when it can be removed, False to
+    retry later, None if Telegram rejected it (see send_result).
+    """
+    if item.kind in ("photo", "video"):
+        if not os.path.exists(item.path):
+            print(f"[INFO] Dropping missing capture {item.path}")
+            return True
+        if item.kind == "video":
+            sent = send_telegram_video(item.path, item.caption or CLIP_CAPTION, item.priority)
+        else:
+            sent = send_telegram_photo(item.path, item.caption or ALERT_CAPTION, item.priority)
+        if sent:
+            try:
+                os.remove(item.path)
+            except:
+                pass
+            return True
+        return sent
+    return send_telegram_text(item.text, item.priority)
+
+def deliver_batch(batch):
+    """
+    Send a batch from group_items(). Albums that fail are split and
+    retried per item. Returns False on the first item that can't be sent.
+    """
+    pending = []
+    for item in batch:
+        if item.kind in ("photo", "video") and not os.path.exists(item.path):
+            print(f"[INFO] Dropping missing capture {item.path}")
+            outbox.ack(item.id)
+        else:
+            pending.append(item)
+
+    hashes = []
+    if dedup is not None and len(pending) > 1:
+        # Drop near-duplicates (of recent uploads or of each other) before
+        # building the album; survivors are recorded once it is sent
+        kept = []
+        for item in pending:
+            image_hash = dedup.hash(item.path)
+            if dedup.check(image_hash, also=hashes):
+                print(f"[INFO] Near-duplicate photo #{item.id} suppressed")
+                try:
+                    os.remove(item.path)
+                except:
+                    pass
+                outbox.ack(item.id)
+                continue
+            kept.append(item)
+            hashes.append(image_hash)
+        pending = kept
+
+    if len(pending) > 1:
+        print(f"[Attempting] album of {len(pending)} photos")
+        if send_telegram_album(pending):
+            print(f"[SUCCESS] Sent album of {len(pending)} photos")
+            if dedup is not None:
+                for image_hash in hashes:
+                    dedup.record(image_hash)
+            for item in pending:
+                perf.observe("outbox_wait", (time.time() - item.created) * 1000)
+                try:
+                    os.remove(item.path)
+                except:
+                    pass
+                outbox.ack(item.id)
+            return True
+        print("[INFO] Album failed, retrying items individually")
+
+    for item in pending:
+        print(f"[Attempting] {item.kind} #{item.id}")
+        sent = deliver(item)
+        if sent:
+            print(f"[SUCCESS] Sent {item.kind} #{item.id}")
+            perf.observe("outbox_wait", (time.time() - item.created) * 1000)
+            outbox.ack(item.id)
+        elif outbox.fail(item.id, permanent=sent is None):
+            # Rejected, or out of attempts: don't let it hold up the queue
+            print(f"[ERROR] Dropping {item.kind} #{item.id} after {item.attempts + 1} attempt(s)")
+            perf.incr("outbox_dropped")
+            if item.path:
+                try:
+                    os.remove(item.path)
+                except:
+                    pass
+        else:
+            print(f"[FAIL] Could not send {item.kind} #{item.id}, retrying later.")
+            return False
+    return True
+
 def upload_worker(stop_event):
-    print("[*] Upload worker started (queue monitor)")
+    print("[*] Upload worker started (outbox sender)")
     while not stop_event.is_set():
-        if not os.path.exists(CAPTURES_DIR):
-            time.sleep(5)
+        items = outbox.next_ready(limit=OUTBOX_BATCH)
+        if not items:
+            # Sleep until a producer enqueues or a retry becomes due
+            due = outbox.next_due()
+            outbox.wait(OUTBOX_IDLE_WAIT if due is None else min(due, OUTBOX_IDLE_WAIT))
             continue
-            
-        files = [f for f in os.listdir(CAPTURES_DIR) if f.endswith(".jpg") or f.endswith(".png")]
-        if not files:
-            time.sleep(5)
+
+        if not connectivity.is_online():
+            print(f"[DEBUG] {len(items)} pending uploads. Offline, waiting for reconnect...")
+            # Woken by the connectivity monitor the moment a probe succeeds
+            connectivity.wait_online(OUTBOX_IDLE_WAIT)
             continue
 
-        print(f"[DEBUG] Found {len(files)} pending uploads. Checking internet...")
-        
-        if check_internet():
-            print("[DEBUG] Internet connected. Processing queue...")
-            for filename in files:
-                # Skip user command files (Commander handles them)
-                if filename.startswith("cmd_"):
-                    continue
-
-                filepath = os.path.join(CAPTURES_DIR, filename)
-                print(f"[Attempting] {filename}")
-                
-                if send_telegram_photo(filepath):
-                    print(f"[SUCCESS] Uploaded {filename}")
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass
-                else:
-                    print(f"[FAIL] Could not upload {filename}, retrying later.")
-        else:
-            print("[DEBUG] No internet. Waiting...")
-        
-        time.sleep(10)
+        for batch in group_items(items):
+            if not deliver_batch(batch):
+                break
 
 # --------------------------------------------------
 # CAMERA WRAPPER
 # --------------------------------------------------
-def capture_intruder():
-    """Wrapper for shared camera logic"""
+def capture_intruder(count=1, caption=ALERT_CAPTION):
+    """Wrapper for shared camera logic (count > 1 = burst)"""
     print("[DEBUG] capture_intruder() called")
-    saved_path = capture_intruder_file(CAPTURES_DIR, CAM_INDEX, prefix="alert_")
-    if saved_path:
-        print(f"[INFO] ✓ Captured: {saved_path}")
-    else:
+    for _ in range(count):
+        with perf.span("alert"):
+            capture_once(caption)
+    if ALERT_CLIP_SECONDS > 0:
+        record_alert_clip(ALERT_CLIP_SECONDS)
+
+def record_alert_clip(seconds):
+    """Record a clip; each segment is queued the moment it closes"""
+    def queue_segment(path, index):
+        print(f"[INFO] ✓ Clip segment {index + 1}: {path}")
+        outbox.put_video(path, f"{CLIP_CAPTION} (part {index + 1})", PRIORITY_ALERT)
+
+    try:
+        with perf.span("alert_clip"):
+            record_clip(
+                CAPTURES_DIR, seconds, CAM_INDEX,
+                session=camera_session,
+                fps=CLIP_FPS,
+                width=CLIP_WIDTH,
+                segment_seconds=CLIP_SEGMENT_SECONDS,
+                prefix="alert_clip_",
+                on_segment=queue_segment
+            )
+    except Exception as e:
+        print(f"[ERROR] Clip recording failed: {e}")
+
+def capture_once(caption=ALERT_CAPTION):
+    # Burst: only the sharpest / best-exposed frame(s) get encoded and sent
+    images = capture_best_bytes(CAM_INDEX, camera_session, BURST_FRAMES, BURST_TOP)
+    if not images:
         print("[ERROR] Capture failed")
+        perf.incr("capture_failures")
+        return
+
+    for data in images:
+        if IN_MEMORY_UPLOAD and connectivity.is_online():
+            # Hot path: stream the in-memory JPEG straight to Telegram.
+            # Disk is only touched if the upload fails.
+            if send_telegram_photo(data, caption, PRIORITY_ALERT, max_wait=ALERT_MAX_WAIT):
+                print("[INFO] ✓ Captured and uploaded (in-memory)")
+                perf.incr("alerts_sent")
+                continue
+        try:
+            saved_path = save_capture_bytes(data, CAPTURES_DIR, prefix="alert_")
+        except Exception as e:
+            print(f"[ERROR] Could not persist capture: {e}")
+            continue
+        print(f"[INFO] ✓ Captured, queued: {saved_path}")
+        perf.incr("alerts_queued")
+        # Wakes the upload worker immediately
+        outbox.put_photo(saved_path, caption, PRIORITY_ALERT)
 
 # --------------------------------------------------
-# EVENT LOG MONITOR
+# IPC (CAPTURE REQUESTS FROM THE COMMANDER)
 # --------------------------------------------------
-def monitor_failed_logins(stop_event):
-    global last_capture_time
-    server = "localhost"
-    log_type = "Security"
+def ipc_capture(args):
+    images = capture_best_bytes(CAM_INDEX, camera_session, args.get("burst", BURST_FRAMES), 1)
+    if not images:
+        return {"ok": False, "error": "Camera unavailable"}, None
+    reply = {}
+    if args.get("hash") and dedup is not None:
+        # cv2 is already loaded here; the commander only compares hashes
+        reply["hash"] = dedup.hash(images[0])
+    return reply, images[0]
+
+def ipc_clip(args):
+    caption = args.get("caption") or CLIP_CAPTION
+
+    def queue_segment(path, index):
+        outbox.put_video(path, f"{caption} (part {index + 1})", PRIORITY_BACKLOG)
+
+    paths = record_clip(
+        CAPTURES_DIR, float(args.get("seconds", 10)), CAM_INDEX,
+        session=camera_session,
+        fps=CLIP_FPS,
+        width=CLIP_WIDTH,
+        segment_seconds=CLIP_SEGMENT_SECONDS,
+        prefix="cmd_clip_",
+        on_segment=queue_segment
+    )
+    if not paths:
+        return {"ok": False, "error": "Camera unavailable"}, None
+    return {"segments": len(paths)}, None
 
+# --------------------------------------------------
+# EVENT LOG MONITOR
+# --------------------------------------------------
+def handle_decisions(decisions):
+    """Act on BruteForceDetector output"""
+    for decision in decisions:
+        if isinstance(decision, Capture):
+            print(f"[ACTION] {decision.account}: {decision.reason}. Capturing x{decision.count}...")
+            threading.Thread(target=capture_intruder, args=(decision.count,), daemon=True).start()
+        else:
+            print(f"[DIGEST] {decision.text}")
+            if outbox:
+                outbox.put_text(decision.text, PRIORITY_ALERT)
+
+def missed_summary(total, accounts, first, last, captures, storms):
+    """One alert text for failures found in the downtime gap"""
+    span = f"{time.strftime('%d.%m %H:%M', time.localtime(first))} - {time.strftime('%H:%M', time.localtime(last))}"
+    lines = [f"🕒 While WatchDog was not running ({span}): {total} failed login{'s' if total != 1 else ''}"]
+    for account, count in sorted(accounts.items(), key=lambda item: -item[1])[:5]:
+        lines.append(f"   • {account}: {count}")
+    if len(accounts) > 5:
+        lines.append(f"   • … {len(accounts) - 5} more accounts")
+    if captures:
+        verdict = f"Detection rules would have alerted {captures} time{'s' if captures != 1 else ''}"
+        if storms:
+            verdict += f" (brute-force storm on {', '.join(sorted(storms))})"
+        lines.append(verdict + ".")
+    else:
+        lines.append("Below the alert threshold.")
+    return "\n".join(lines)
+
+def catch_up_missed(source, detector, after_record):
+    """
+    Read the events logged after `after_record` (service restart, crash,
+    boot) in large batches and run them through the detector with their
+    original timestamps. Instead of one alert per decision, a single
+    summary goes out; a capture is taken only if the attack was still
+    going on within the detection window. Returns the last record read.
+    """
+    start = time.perf_counter()
+    total = 0
+    last_record = None
+    first = last = None
+    accounts = {}
+    captures = 0
+    storms = set()
+    for events in source.catch_up(after_record, CATCH_UP_BATCH):
+        for event in events:
+            last_record = max(last_record or 0, event.record_number)
+            if event.event_id != TARGET_EVENT_ID:
+                continue
+            failure = parse_failed_logon(event)
+            total += 1
+            accounts[failure.account] = accounts.get(failure.account, 0) + 1
+            first = failure.time if first is None else min(first, failure.time)
+            last = failure.time if last is None else max(last, failure.time)
+            for decision in detector.observe(failure, failure.time):
+                if isinstance(decision, Capture):
+                    captures += 1
+                    if decision.reason == "storm":
+                        storms.add(decision.account)
+    if not total:
+        return last_record
+
+    # Settle storms that ended during the gap; their digests are in the summary
+    detector.tick()
+    perf.observe("eventlog_catch_up", (time.perf_counter() - start) * 1000)
+    perf.incr("failed_logins", total)
+    print(f"[ALERT] Catch-up: {total} failed logins since record {after_record} "
+          f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+    if outbox:
+        outbox.put_text(missed_summary(total, accounts, first, last, captures, storms), PRIORITY_ALERT)
+
+    # Still going on? Someone may be at the keyboard right now
+    if captures and time.time() - last <= detector.window:
+        handle_decisions([Capture(max(accounts, key=accounts.get), 1, "attempts continued through restart")])
+    return last_record
+
+def resume_from_bookmark(source, detector, bookmark):
+    """Catch up from the saved bookmark (or set one on the very first run)"""
+    after = bookmark.load()
+    if after is None:
+        # First run, or a torn bookmark: replaying the whole log history as
+        # "missed" failures could trigger a capture, so start from now
+        bookmark.save(source.latest_record())
+        return None
+    if not CATCH_UP:
+        return None
     try:
-        handle = win32evtlog.OpenEventLog(server, log_type)
-        # 1. Position at the end
-        back_flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
-        events = win32evtlog.ReadEventLog(handle, back_flags, 0)
-        last_record = events[0].RecordNumber if events else 0
+        caught_up = catch_up_missed(source, detector, after)
+    except Exception as e:
+        print(f"[ERROR] Event log catch-up failed: {e}")
+        return None
+    if caught_up:
+        bookmark.save(caught_up)
+    return caught_up
 
-        print(f"[*] Anchored at record {last_record}")
-        print("[*] Monitoring Security log (INSTANT MODE - Fast Detection)")
+def monitor_failed_logins(stop_event, source=None):
+    security = CONFIG.get("security", {})
+    detector = BruteForceDetector.from_config(security)
+    bookmark = OffsetStore(BOOKMARK_PATH, "event log bookmark")
 
-        start_time = time.time()
-        failed_count = 0
+    try:
+        if source is None:
+            source = open_event_source(security, TARGET_EVENT_ID)
+        print(f"[*] Monitoring Security log (backend: {source.name})")
+        if not monitor_armed.is_set():
+            monitor_armed.set()
+            STARTUP.mark("armed")
+        # Live events are already being queued by the source meanwhile
+        caught_up = resume_from_bookmark(source, detector, bookmark)
+        last_record = None
+        last_saved = time.time()
 
         while not stop_event.is_set():
             try:
-                # Use SEEK_READ to strictly read from the last known position forward
-                flags = win32evtlog.EVENTLOG_FORWARDS_READ | win32evtlog.EVENTLOG_SEEK_READ
-                events = win32evtlog.ReadEventLog(handle, flags, last_record)
-                
-                if not events:
-                    time.sleep(0.5)
-                    continue
+                # Blocks until the backend signals new events (or timeout)
+                events = source.read(EVENT_WAIT_TIMEOUT)
 
                 for event in events:
-                    # Skip events we've already processed
-                    if event.RecordNumber <= last_record:
+                    # Also returned by the catch-up query
+                    if caught_up and event.record_number <= caught_up:
+                        continue
+                    last_record = event.record_number
+                    if event.event_id != TARGET_EVENT_ID:
                         continue
-                        
-                    last_record = event.RecordNumber
-
-                    # Only process events that happened after we started monitoring
-                    # (Optional safety, but RecordNumber handling is usually sufficient)
-                    
-                    if event.EventID == TARGET_EVENT_ID:
-                        failed_count += 1
-                        print(f"[ALERT] Failed login #{failed_count} (Event {event.RecordNumber})")
-
-                        if failed_count >= FAILED_THRESHOLD:
-                            now = time.time()
-                            if now - last_capture_time >= CAPTURE_COOLDOWN:
-                                print(f"[ACTION] Wrong Password Threshold Reached! Capturing...")
-                                threading.Thread(target=capture_intruder, daemon=True).start()
-                                last_capture_time = now
-                                failed_count = 0  # Reset after capture
-                            else:
-                                print("[INFO] Capture on cooldown")
-                                failed_count = 0 # Reset anyway
-            
-                time.sleep(0.5)
+
+                    failure = parse_failed_logon(event)
+                    latency_ms = (time.time() - event.time_generated) * 1000
+                    perf.observe("event_detection", latency_ms)
+                    perf.incr("failed_logins")
+                    print(f"[ALERT] Failed login for {failure.account} (Event {event.record_number}, +{latency_ms:.0f}ms)")
+
+                    # Someone is at the lock screen: warm the camera now so the
+                    # threshold capture doesn't pay the device-open cost
+                    if CAM_KEEP_WARM:
+                        camera_session.arm()
+
+                    handle_decisions(detector.observe(failure, failure.time))
+
+                # Digests / storm end while the log is quiet
+                handle_decisions(detector.tick())
+
+                if last_record is not None and time.time() - last_saved >= BOOKMARK_SAVE_INTERVAL:
+                    bookmark.save(last_record)
+                    last_saved = time.time()
+
+                if getattr(source, "exhausted", False):
+                    print("[*] Replay finished")
+                    break
 
             except Exception as e:
                 # If handle becomes invalid or other issues
                 print(f"[ERROR] Event Loop: {e}")
                 time.sleep(2)
-                # Try to recover handle
-                try: 
-                    handle = win32evtlog.OpenEventLog(server, log_type) 
+                # Try to recover the source
+                try:
+                    source.close()
+                    source = open_event_source(security, TARGET_EVENT_ID)
+                    # Pick up what was logged while the source was down
+                    if last_record is not None:
+                        bookmark.save(last_record)
+                    caught_up = resume_from_bookmark(source, detector, bookmark)
                 except: pass
 
+        if last_record is not None:
+            bookmark.save(last_record)
+
     except Exception as e:
         print(f"[CRITICAL] Event Log Error: {e}")
 
@@ -225,20 +647,74 @@ def monitor_failed_logins(stop_event):
 # --------------------------------------------------
 def send_shutdown_alert():
     if not BOT_TOKEN or not CHAT_ID: return
+    text = "⚠️ System Shutdown Detected! WatchDog is stopping."
+    if not connectivity.is_online():
+        if outbox:
+            outbox.put_text(text, PRIORITY_ALERT)
+        return
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        requests.post(url, json={"chat_id": CHAT_ID, "text": "⚠️ System Shutdown Detected! WatchDog is stopping."}, timeout=2)
+        resp = transport.call(
+            "sendMessage", json={"chat_id": CHAT_ID, "text": text},
+            timeout=2, priority=PRIORITY_ALERT, max_wait=1
+        )
+        if resp.status_code == 200:
+            return
     except:
         pass
+    # Offline: persist so it goes out after the next boot
+    if outbox:
+        outbox.put_text(text, PRIORITY_ALERT)
+
+WM_WTSSESSION_CHANGE = 0x02B1
+WTS_SESSION_LOCK = 0x7
+WTS_SESSION_UNLOCK = 0x8
+
+def on_motion():
+    threading.Thread(target=capture_intruder, args=(1, MOTION_CAPTION), daemon=True).start()
+
+def on_workstation_locked():
+    global motion_watch
+    if CAM_KEEP_WARM:
+        # Arm the camera while the workstation is locked
+        print("[*] Workstation locked, arming camera")
+        camera_session.arm()
+    if MOTION_WATCH:
+        if motion_watch is None:
+            settings = CONFIG.get("camera", {})
+            motion_watch = MotionWatch(
+                camera_session, on_motion,
+                fps=settings.get("motion_fps", 4),
+                cooldown=settings.get("motion_cooldown_seconds", 30),
+                detector=MotionDetector(
+                    pixel_threshold=settings.get("motion_pixel_threshold", 25),
+                    min_area=settings.get("motion_min_area", 0.02)
+                )
+            )
+        motion_watch.start()
+
+def on_workstation_unlocked():
+    if motion_watch:
+        motion_watch.stop()
+    camera_session.disarm()
 
 def run_shutdown_monitor():
-    if not win32gui: return
-    
+    try:
+        import win32gui
+        import win32con
+    except ImportError:
+        return
+
     def wnd_proc(hwnd, msg, wparam, lparam):
         if msg == win32con.WM_QUERYENDSESSION:
             print("[ALERT] Shutdown detected!")
             send_shutdown_alert()
             return 1
+        if msg == WM_WTSSESSION_CHANGE:
+            if wparam == WTS_SESSION_LOCK:
+                on_workstation_locked()
+            elif wparam == WTS_SESSION_UNLOCK:
+                on_workstation_unlocked()
+            return 0
         return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
 
     wc = win32gui.WNDCLASS()
@@ -251,17 +727,46 @@ def run_shutdown_monitor():
     except: pass
     
     try:
-        win32gui.CreateWindowEx(0, wc.lpszClassName, "WD_Shutdown_Listener", 0, 0, 0, 0, 0, 0, 0, 0, None)
+        hwnd = win32gui.CreateWindowEx(0, wc.lpszClassName, "WD_Shutdown_Listener", 0, 0, 0, 0, 0, 0, 0, 0, None)
+        try:
+            import win32ts
+            win32ts.WTSRegisterSessionNotification(hwnd, win32ts.NOTIFY_FOR_ALL_SESSIONS)
+        except Exception as e:
+            print(f"[DEBUG] Lock notifications unavailable: {e}")
         win32gui.PumpMessages()
     except: pass
 
+# --------------------------------------------------
+# PREWARM
+# --------------------------------------------------
+def prewarm():
+    """Load the heavy dependencies off the critical path (after arming)"""
+    # Don't compete with the event source for disk/CPU while it opens
+    monitor_armed.wait(10)
+    try:
+        camera.prewarm()
+        STARTUP.mark("cv2_ready")
+    except Exception as e:
+        print(f"[ERROR] Camera prewarm failed: {e}")
+    try:
+        transport.prewarm(CONFIG.get("network", {}).get("probe_url", "https://api.telegram.org"))
+        STARTUP.mark("transport_ready")
+    except Exception as e:
+        print(f"[ERROR] Transport prewarm failed: {e}")
+    print(f"[STARTUP] {STARTUP.summary()}")
+
 # --------------------------------------------------
 # ENTRY POINT
 # --------------------------------------------------
 def start_service(stop_event):
+    global outbox
     print("[*] Service Mode: Starting Security Monitor & Upload Worker")
-    
-    # 1. Start Event Monitor
+    STARTUP.mark("loaded")
+
+    # Cheap (SQLite open); capture threads need it as soon as we're armed
+    outbox = Outbox(OUTBOX_PATH)
+
+    # 1. Start Event Monitor (first, so an early failed PIN is seen)
     monitor_thread = threading.Thread(
         target=monitor_failed_logins,
         args=(stop_event,),
@@ -269,7 +774,17 @@ def start_service(stop_event):
     )
     monitor_thread.start()
 
-    # 2. Start Upload Worker
+    # 2. Prewarm cv2 + HTTP stack in the background
+    if PREWARM:
+        threading.Thread(target=prewarm, daemon=True).start()
+
+    # Flush queued alerts the moment the network comes back
+    connectivity.add_listener(outbox.wake)
+    adopted = outbox.adopt_dir(CAPTURES_DIR, caption=ALERT_CAPTION)
+    if adopted:
+        print(f"[*] Queued {adopted} leftover captures")
+
+    # 3. Start Upload Worker
     upload_thread = threading.Thread(
         target=upload_worker,
         args=(stop_event,),
@@ -277,12 +792,48 @@ def start_service(stop_event):
     )
     upload_thread.start()
 
-    # 3. Start Shutdown Monitor (Low Priority)
+    # 4. Serve /capture and /clip for the commander (one camera owner)
+    if CONFIG.get("ipc", {}).get("enabled", True):
+        CaptureAgent(
+            CONFIG.get("ipc", {}).get("address") or default_address(CAPTURES_DIR),
+            authkey_from_token(BOT_TOKEN),
+            {"capture": ipc_capture, "clip": ipc_clip}
+        ).start()
+
+    # 5. Start Metrics Sampler (history survives restarts)
+    try:
+        sampler = MetricsSampler(
+            os.path.join(CAPTURES_DIR, METRICS_FILE_NAME),
+            interval=METRICS_INTERVAL,
+            capacity=METRICS_HISTORY
+        )
+        sampler.start()
+    except Exception as e:
+        print(f"[ERROR] Metrics sampler unavailable: {e}")
+
+    # 6. Start Perf Exporter (snapshot for /perf, optional Prometheus)
+    try:
+        prom_file = PERF_PROM_FILE
+        if prom_file and not os.path.isabs(prom_file):
+            prom_file = os.path.join(CAPTURES_DIR, prom_file)
+        PerfExporter(
+            os.path.join(CAPTURES_DIR, PERF_FILE_NAME),
+            process="service",
+            interval=PERF_INTERVAL,
+            prom_file=prom_file,
+            port=PERF_PROM_PORT,
+            peers={"commander": os.path.join(CAPTURES_DIR, COMMANDER_PERF_FILE_NAME)}
+        ).start()
+    except Exception as e:
+        print(f"[ERROR] Perf exporter unavailable: {e}")
+
+    # 7. Start Shutdown Monitor (Low Priority)
     shutdown_thread = threading.Thread(
         target=run_shutdown_monitor,
         daemon=True
     )
     shutdown_thread.start()
+    STARTUP.mark("ready")
 
 def start_commander():
     print("[*] Commander Mode: Starting Telegram Agent")
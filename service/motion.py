@@ -0,0 +1,167 @@
+import time
+import threading
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+# --------------------------------------------------
+# DETECTOR
+# --------------------------------------------------
+class MotionDetector:
+    """
+    Frame differencing against a running-average background, fully
+    vectorized in NumPy on a decimated grayscale view of the frame
+    (every `step`-th pixel, e.g. 640x480 -> 80x60). All work buffers are
+    allocated once on the first frame.
+    - a pixel "changed" if |gray - background| > pixel_threshold
+    - motion when >= min_area of the pixels changed for confirm_frames
+      consecutive frames (filters sensor noise and single glitches)
+    - >= lighting_area changed at once is a lighting/exposure jump:
+      the background is reset instead of reporting motion
+    """
+    def __init__(self, step=8, alpha=0.05, pixel_threshold=25, min_area=0.02,
+                 confirm_frames=2, lighting_area=0.8):
+        self.step = step
+        self.alpha = alpha
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.confirm_frames = confirm_frames
+        self.lighting_area = lighting_area
+
+        self.background = None
+        self._gray = None
+        self._scratch = None
+        self._mask = None
+        self._streak = 0
+        self.last_fraction = 0.0
+
+    def reset(self):
+        self.background = None
+        self._streak = 0
+
+    def _to_gray(self, frame):
+        """BT.601 luma of the decimated view, into the reused buffer"""
+        import numpy as np
+        small = frame[::self.step, ::self.step]
+        if small.ndim == 2:
+            np.copyto(self._gray, small, casting="unsafe")
+            return self._gray
+        gray, scratch = self._gray, self._scratch
+        # OpenCV frames are BGR
+        np.multiply(small[..., 0], np.float32(0.114), out=gray)
+        np.multiply(small[..., 1], np.float32(0.587), out=scratch)
+        gray += scratch
+        np.multiply(small[..., 2], np.float32(0.299), out=scratch)
+        gray += scratch
+        return gray
+
+    def feed(self, frame):
+        """Process one frame. Returns True when motion is confirmed."""
+        import numpy as np
+        if self._gray is None or self._gray.shape != frame[::self.step, ::self.step].shape[:2]:
+            shape = frame[::self.step, ::self.step].shape[:2]
+            self._gray = np.empty(shape, dtype=np.float32)
+            self._scratch = np.empty(shape, dtype=np.float32)
+            self._mask = np.empty(shape, dtype=bool)
+            self.background = None
+
+        gray = self._to_gray(frame)
+        if self.background is None:
+            self.background = gray.copy()
+            return False
+
+        diff = self._scratch
+        np.subtract(gray, self.background, out=diff)
+        np.abs(diff, out=diff)
+        np.greater(diff, self.pixel_threshold, out=self._mask)
+        fraction = np.count_nonzero(self._mask) / self._mask.size
+        self.last_fraction = fraction
+
+        if fraction >= self.lighting_area:
+            # Lights switched / auto-exposure jump: relearn the scene
+            np.copyto(self.background, gray)
+            self._streak = 0
+            return False
+
+        # background += alpha * (gray - background)
+        np.subtract(gray, self.background, out=diff)
+        diff *= self.alpha
+        self.background += diff
+
+        if fraction >= self.min_area:
+            self._streak += 1
+        else:
+            self._streak = 0
+        return self._streak >= self.confirm_frames
+
+# --------------------------------------------------
+# WATCH LOOP
+# --------------------------------------------------
+class MotionWatch:
+    """
+    Background "armed watch": samples the (warm) camera session at a few
+    FPS while the workstation is locked and calls on_motion() when the
+    detector fires, at most once per cooldown seconds.
+    """
+    def __init__(self, session, on_motion, fps=4, cooldown=30, detector=None):
+        self.session = session
+        self.on_motion = on_motion
+        self.interval = 1.0 / fps
+        self.cooldown = cooldown
+        self.detector = detector or MotionDetector()
+        self.triggers = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.detector.reset()
+        self._thread = threading.Thread(target=self._loop, name="motion-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop and wait for a frame in flight, so a disarm() after this sticks"""
+        self._stop.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        print("[*] Motion watch started")
+        last_trigger = 0.0
+        # Keep the device open between samples
+        self.session.arm(block=True)
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                if not self.session.armed:
+                    # Idle reaper fired (e.g. after read failures); never
+                    # re-arm once stop() has been called
+                    if self._stop.is_set():
+                        break
+                    self.session.arm(block=True)
+                frame = self.session.read()
+                if frame is None:
+                    self._stop.wait(1.0)
+                    continue
+                with perf.span("motion_frame"):
+                    moved = self.detector.feed(frame)
+                if moved and time.time() - last_trigger >= self.cooldown:
+                    last_trigger = time.time()
+                    self.triggers += 1
+                    perf.incr("motion_triggers")
+                    print(f"[ALERT] Motion detected ({self.detector.last_fraction * 100:.0f}% of frame)")
+                    self.on_motion()
+            except Exception as e:
+                print(f"[ERROR] Motion watch: {e}")
+                self._stop.wait(1.0)
+            self._stop.wait(max(0.0, self.interval - (time.perf_counter() - started)))
+        print("[*] Motion watch stopped")
@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+# Lower value = sent first
+PRIORITY_ALERT = 0
+PRIORITY_REPLY = 5
+PRIORITY_BACKLOG = 10
+
+OUTBOX_DB_NAME = "outbox.db"
+MAX_BACKOFF = 300  # Seconds between retries of a single item (cap)
+MAX_ATTEMPTS = 20  # About an hour of failed sends while online, then the item is dropped
+
+OutboxItem = namedtuple("OutboxItem", ["id", "kind", "path", "text", "caption", "priority", "attempts", "created"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    path TEXT,
+    text TEXT,
+    caption TEXT,
+    priority INTEGER NOT NULL DEFAULT 10,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    next_attempt REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (next_attempt, priority, id);
+CREATE INDEX IF NOT EXISTS outbox_path ON outbox (path);
+"""
+
+class Outbox:
+    """
+    Durable, indexed send queue for photos and text messages (SQLite, WAL).
+    Producers call put_*() which wakes the sender immediately; the sender
+    blocks in wait() instead of scanning the captures directory.
+    Safe to share between the service and commander processes.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+        self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    # ---------------- producers ----------------
+    def _put(self, kind, path=None, text=None, caption=None, priority=PRIORITY_BACKLOG):
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (kind, path, text, caption, priority, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, path, text, caption, priority, time.time())
+            )
+            self._db.commit()
+        self._wake.set()
+        return cur.lastrowid
+
+    def put_photo(self, path, caption=None, priority=PRIORITY_ALERT):
+        return self._put("photo", path=path, caption=caption, priority=priority)
+
+    def put_video(self, path, caption=None, priority=PRIORITY_ALERT):
+        return self._put("video", path=path, caption=caption, priority=priority)
+
+    def put_text(self, text, priority=PRIORITY_REPLY):
+        return self._put("text", text=text, priority=priority)
+
+    def adopt_dir(self, directory, extensions=(".jpg", ".png"), skip_prefix="cmd_", caption=None):
+        """One-off import of capture files left on disk by older versions"""
+        adopted = 0
+        for filename in os.listdir(directory):
+            if not filename.endswith(extensions) or filename.startswith(skip_prefix):
+                continue
+            path = os.path.join(directory, filename)
+            with self._lock:
+                known = self._db.execute("SELECT 1 FROM outbox WHERE path = ?", (path,)).fetchone()
+            if not known:
+                self.put_photo(path, caption, PRIORITY_BACKLOG)
+                adopted += 1
+        return adopted
+
+    # ---------------- sender ----------------
+    def next_ready(self, limit=1, kind=None):
+        """Items due now, highest priority first"""
+        query = "SELECT id, kind, path, text, caption, priority, attempts, created FROM outbox WHERE next_attempt <= ?"
+        args = [time.time()]
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        query += " ORDER BY priority, id LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        return [OutboxItem(*row) for row in rows]
+
+    def next_due(self):
+        """Seconds until the earliest item becomes due (None if empty)"""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM outbox").fetchone()
+        if not row or row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def ack(self, item_id):
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (item_id,))
+            self._db.commit()
+
+    def fail(self, item_id, permanent=False):
+        """
+        Record a failed attempt and back the item off exponentially.
+        After MAX_ATTEMPTS, or at once if `permanent` (Telegram rejected
+        it), the item is removed instead. Returns True if it was removed;
+        its file is then the caller's to delete.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM outbox WHERE id = ?", (item_id,)).fetchone()
+            if not row:
+                return False
+            attempts = row[0] + 1
+            if permanent or attempts >= MAX_ATTEMPTS:
+                self._db.execute("DELETE FROM outbox WHERE id = ?", (item_id,))
+                self._db.commit()
+                return True
+            delay = min(MAX_BACKOFF, 2 ** attempts)
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                (attempts, time.time() + delay, item_id)
+            )
+            self._db.commit()
+        return False
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def wait(self, timeout=None):
+        """Sleep until a producer enqueues (or timeout). Returns True if woken."""
+        woken = self._wake.wait(timeout)
+        self._wake.clear()
+        return woken
+
+    def wake(self):
+        self._wake.set()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
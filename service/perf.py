@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import bisect
+import threading
+from array import array
+from contextlib import contextmanager
+
+# Fixed latency bucket upper bounds (ms). The last bucket is +Inf.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+PERF_FILE_NAME = "perf.json"
+COMMANDER_PERF_FILE_NAME = "perf_commander.json"
+
+# --------------------------------------------------
+# HISTOGRAM
+# --------------------------------------------------
+class Histogram:
+    """
+    Fixed-bucket latency histogram (array('Q') counts, one slot per bound
+    plus +Inf). observe() is a bisect and an increment; no samples kept.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = array("Q", [0]) * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def to_dict(self):
+        return {"counts": list(self.counts), "count": self.count, "sum": self.total, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, raw):
+        hist = cls()
+        for i, value in enumerate(raw.get("counts", ())[:len(hist.counts)]):
+            hist.counts[i] = value
+        hist.count = raw.get("count", 0)
+        hist.total = raw.get("sum", 0.0)
+        hist.max = raw.get("max", 0.0)
+        return hist
+
+    def percentile(self, pct):
+        """Estimate from buckets (linear inside the bucket, capped at max)"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+            if n and seen + n >= rank:
+                value = lower + (upper - lower) * ((rank - seen) / n)
+                return min(value, self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+# --------------------------------------------------
+# REGISTRY
+# --------------------------------------------------
+class PerfRegistry:
+    """Named latency histograms and counters for one process"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, name, ms):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(ms)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        """with span("camera_open"): ...  -> records elapsed ms, counts errors"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr(f"{name}_errors")
+            raise
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "started": self.started,
+                "time": time.time(),
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+
+REGISTRY = PerfRegistry()
+
+# Module-level shortcuts on the process registry
+def observe(name, ms):
+    REGISTRY.observe(name, ms)
+
+def incr(name, amount=1):
+    REGISTRY.incr(name, amount)
+
+def span(name):
+    return REGISTRY.span(name)
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+# --------------------------------------------------
+# STARTUP PHASES
+# --------------------------------------------------
+def process_start_time():
+    """
+    Wall-clock creation time of this process. For a PyInstaller onefile
+    exe this is the bootloader parent, so archive unpacking is included.
+    """
+    try:
+        import sys
+        import psutil
+        proc = psutil.Process()
+        if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+            parent = proc.parent()
+            if parent is not None and os.path.basename(parent.exe()) == os.path.basename(sys.executable):
+                proc = parent
+        return proc.create_time()
+    except Exception:
+        return _IMPORTED_AT
+
+_IMPORTED_AT = time.time()
+
+
+class StartupTimer:
+    """
+    Marks named startup phases relative to process start. Each phase is
+    also recorded as a startup_<phase> histogram, so boots show in /perf.
+    """
+    def __init__(self, origin=None):
+        self.origin = origin if origin is not None else process_start_time()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        elapsed_ms = (time.time() - self.origin) * 1000
+        with self._lock:
+            self.phases.append((phase, elapsed_ms))
+        observe(f"startup_{phase}", elapsed_ms)
+        print(f"[STARTUP] {phase} +{elapsed_ms:.0f}ms")
+        return elapsed_ms
+
+    def summary(self):
+        with self._lock:
+            return ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in self.phases)
+
+# --------------------------------------------------
+# SNAPSHOT FILES
+# --------------------------------------------------
+def save_snapshot(path, snap=None):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snap or snapshot(), f)
+    os.replace(tmp, path)
+
+def load_snapshot(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+# --------------------------------------------------
+# REPORTS
+# --------------------------------------------------
+def format_report(snapshots):
+    """Telegram Markdown report. snapshots: {"service": snap, "commander": snap}"""
+    lines = ["⏱️ *Performance (p50/p99/max ms)*", "------------------------"]
+    for process, snap in snapshots.items():
+        if not snap:
+            lines.append(f"_{process}: no data_")
+            continue
+        uptime = int(snap.get("time", time.time()) - snap.get("started", time.time()))
+        lines.append(f"*{process}* (up {uptime // 3600}h{uptime % 3600 // 60:02d}m)")
+        histograms = snap.get("histograms", {})
+        if not histograms:
+            lines.append("   no timings yet")
+        for name in sorted(histograms):
+            hist = Histogram.from_dict(histograms[name])
+            lines.append(f"   `{name}` {hist.percentile(50):.0f}/{hist.percentile(99):.0f}/"
+                         f"{hist.max:.0f} (n={hist.count})")
+        counters = snap.get("counters", {})
+        if counters:
+            lines.append("   " + ", ".join(f"{k}={v}" for k, v in sorted(counters.items())))
+    return "\n".join(lines)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def prometheus_text(snapshots):
+    """Prometheus text exposition (0.0.4) for one or more process snapshots"""
+    out = [
+        "# HELP watchdog_latency_ms Stage latency in milliseconds",
+        "# TYPE watchdog_latency_ms histogram",
+    ]
+    for process, snap in snapshots.items():
+        for name, raw in sorted((snap or {}).get("histograms", {}).items()):
+            labels = f'process="{_label(process)}",stage="{_label(name)}"'
+            cumulative = 0
+            for i, n in enumerate(raw["counts"]):
+                cumulative += n
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else "+Inf"
+                out.append(f'watchdog_latency_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            out.append(f"watchdog_latency_ms_sum{{{labels}}} {raw['sum']:.3f}")
+            out.append(f"watchdog_latency_ms_count{{{labels}}} {raw['count']}")
+
+    out.append("# HELP watchdog_events_total Event counters")
+    out.append("# TYPE watchdog_events_total counter")
+    for process, snap in snapshots.items():
+        for name, value in sorted((snap or {}).get("counters", {}).items()):
+            out.append(f'watchdog_events_total{{process="{_label(process)}",name="{_label(name)}"}} {value}')
+    return "\n".join(out) + "\n"
+
+# --------------------------------------------------
+# EXPORTER
+# --------------------------------------------------
+class PerfExporter:
+    """
+    Background thread persisting this process's snapshot every `interval`
+    seconds (read by the commander's /perf), plus an optional Prometheus
+    text file and an optional 127.0.0.1 HTTP endpoint (/metrics).
+    `peers` maps process name -> snapshot path of other processes to merge.
+    """
+    def __init__(self, snapshot_path, process="service", interval=30, prom_file=None, port=0, peers=None):
+        self.snapshot_path = snapshot_path
+        self.process = process
+        self.interval = interval
+        self.prom_file = prom_file
+        self.port = port
+        self.peers = peers or {}
+        self._stop = threading.Event()
+        self._server = None
+
+    def collect(self):
+        snapshots = {self.process: snapshot()}
+        for name, path in self.peers.items():
+            try:
+                snapshots[name] = load_snapshot(path)
+            except (OSError, ValueError):
+                pass
+        return snapshots
+
+    def export(self):
+        save_snapshot(self.snapshot_path, snapshot())
+        if self.prom_file:
+            tmp = self.prom_file + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(prometheus_text(self.collect()))
+            os.replace(tmp, self.prom_file)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception as e:
+                print(f"[ERROR] Perf export failed: {e}")
+
+    def _serve(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = prometheus_text(exporter.collect()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        # Loopback only: the numbers reveal activity on the machine
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            print(f"[ERROR] Perf endpoint unavailable on port {self.port}: {e}")
+            return
+        self._server.daemon_threads = True
+        print(f"[*] Perf metrics on http://127.0.0.1:{self._server.server_address[1]}/metrics")
+        self._server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+        if self.port:
+            threading.Thread(target=self._serve, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
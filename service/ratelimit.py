@@ -0,0 +1,165 @@
+import time
+import heapq
+import threading
+import itertools
+
+try:
+    # Lower value = granted first (same scale as the outbox)
+    from outbox import PRIORITY_REPLY
+except ImportError:
+    from service.outbox import PRIORITY_REPLY
+
+
+class RateLimited(Exception):
+    """The limiter could not grant a send within the caller's max_wait"""
+    def __init__(self, wait):
+        super().__init__(f"rate limited, next slot in {wait:.1f}s")
+        self.wait = wait
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, up to `capacity` banked for bursts.
+    A send costing more than `capacity` (a 10-photo album) waits for a
+    full bucket and then overdraws it, so the sends after it wait until
+    the debt is paid off: the long-run rate holds whatever the cost.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now, cost=1):
+        """Seconds until `cost` tokens are available"""
+        self._refill(now)
+        missing = min(cost, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, now, cost=1):
+        self._refill(now)
+        self.tokens -= cost  # May go negative, see above
+
+
+class RateLimiter:
+    """
+    Scheduler for outbound Bot API sends.
+    - a global bucket (Telegram: ~30 messages/s per bot) and one bucket
+      per chat (~1 message/s, small bursts tolerated)
+    - a 429's retry_after blocks the chat (or everything) until it expires
+    - waiting senders are granted strictly by priority, then FIFO, so an
+      alert overtakes a backlog drain and a reply overtakes bulk uploads
+    """
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chats = {}
+        self.blocked_until = {}  # chat key (None = all) -> monotonic time
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []  # heap of (priority, seq)
+        self.metrics = {
+            "granted": 0,
+            "throttled": 0,   # 429 responses
+            "timeouts": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        The service and the commander send as the same bot to the same
+        owner chat, each with its own limiter: each gets 1/processes of
+        the budget so together they stay within Telegram's limits.
+        """
+        share = 1.0 / max(1, config.get("processes", 2))
+        return cls(
+            global_rate=config.get("global_per_second", 30) * share,
+            chat_rate=config.get("chat_per_second", 1) * share,
+            chat_burst=max(1, config.get("chat_burst", 3) * share),
+        )
+
+    def _bucket(self, chat):
+        bucket = self.chats.get(chat)
+        if bucket is None:
+            bucket = self.chats[chat] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _delay(self, chat, cost, now):
+        delay = max(
+            self.blocked_until.get(None, 0) - now,
+            self.blocked_until.get(chat, 0) - now,
+            self.global_bucket.delay(now, cost),
+        )
+        if chat is not None:
+            delay = max(delay, self._bucket(chat).delay(now, cost))
+        return delay
+
+    def acquire(self, chat=None, priority=PRIORITY_REPLY, cost=1, max_wait=None):
+        """
+        Block until this send may go out. Returns the seconds waited.
+        Raises RateLimited if that would take longer than max_wait.
+        """
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] == ticket:
+                        delay = self._delay(chat, cost, now)
+                        if delay <= 0:
+                            self.global_bucket.take(now, cost)
+                            if chat is not None:
+                                self._bucket(chat).take(now, cost)
+                            break
+                    else:
+                        # Someone more urgent is ahead; wait for our turn
+                        delay = None
+                    if max_wait is not None:
+                        remaining = max_wait - (now - start)
+                        if remaining <= 0 or (delay is not None and delay > remaining):
+                            self.metrics["timeouts"] += 1
+                            raise RateLimited(delay if delay is not None else remaining)
+                        delay = remaining if delay is None else delay
+                    self._cond.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self.metrics["granted"] += 1
+            self.metrics["wait_total"] += waited
+            self.metrics["wait_max"] = max(self.metrics["wait_max"], waited)
+        return waited
+
+    def penalize(self, retry_after, chat=None):
+        """Honour a 429: nothing goes to `chat` (None = any chat) for retry_after s"""
+        with self._cond:
+            until = time.monotonic() + retry_after
+            self.blocked_until[chat] = max(self.blocked_until.get(chat, 0), until)
+            self.metrics["throttled"] += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            result = dict(self.metrics)
+            now = time.monotonic()
+            result["queued"] = len(self._waiting)
+            result["queued_by_priority"] = {}
+            for priority, _ in self._waiting:
+                result["queued_by_priority"][priority] = result["queued_by_priority"].get(priority, 0) + 1
+            result["blocked_for"] = max([0.0] + [until - now for until in self.blocked_until.values()])
+            result["wait_avg"] = result["wait_total"] / result["granted"] if result["granted"] else 0.0
+        return result
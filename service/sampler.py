@@ -0,0 +1,238 @@
+import os
+import math
+import time
+import struct
+import threading
+from array import array
+
+# One row per sample. NaN = metric unavailable (e.g. no battery).
+FIELDS = ("time", "cpu", "ram", "disk", "battery", "plugged", "net_up", "net_sent_kbps", "net_recv_kbps")
+METRICS_FILE_NAME = "metrics.ring"
+RING_MAGIC = b"WDMR"
+RING_VERSION = 1
+HEADER = struct.Struct("<4sIIII")  # magic, version, fields, capacity, written
+
+NAN = float("nan")
+
+# --------------------------------------------------
+# RING BUFFER
+# --------------------------------------------------
+class MetricsRing:
+    """
+    Fixed-size ring of float64 rows in one flat array('d').
+    Persists as a small header + the raw array (capacity * fields * 8 bytes).
+    """
+    def __init__(self, capacity=1440):
+        self.capacity = capacity
+        self.width = len(FIELDS)
+        self.data = array("d", [NAN]) * (capacity * self.width)
+        self.written = 0  # Total rows ever written (head = written % capacity)
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, row):
+        base = (self.written % self.capacity) * self.width
+        for i, value in enumerate(row):
+            self.data[base + i] = value
+        self.written += 1
+
+    def row(self, index):
+        """index 0 = oldest retained row"""
+        start = self.written - len(self)
+        base = ((start + index) % self.capacity) * self.width
+        return self.data[base:base + self.width]
+
+    def rows(self, since=None):
+        """Rows oldest to newest, optionally only those with time >= since"""
+        for i in range(len(self)):
+            row = self.row(i)
+            if since is None or row[0] >= since:
+                yield row
+
+    def latest(self):
+        if not self.written:
+            return None
+        return dict(zip(FIELDS, self.row(len(self) - 1)))
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(RING_MAGIC, RING_VERSION, self.width, self.capacity, self.written))
+            self.data.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, capacity=None):
+        """Load a saved ring. Rows are re-packed if the capacity changed."""
+        with open(path, "rb") as f:
+            magic, version, width, saved_capacity, written = HEADER.unpack(f.read(HEADER.size))
+            if magic != RING_MAGIC or version != RING_VERSION or width != len(FIELDS):
+                raise ValueError("Unsupported metrics history file")
+            saved = cls(saved_capacity)
+            saved.data = array("d")
+            saved.data.fromfile(f, saved_capacity * width)
+            saved.written = written
+
+        if capacity is None or capacity == saved_capacity:
+            return saved
+        ring = cls(capacity)
+        for row in saved.rows():
+            ring.append(row)
+        return ring
+
+# --------------------------------------------------
+# SAMPLER
+# --------------------------------------------------
+def summarize(rows):
+    """min/avg/max per metric over the given rows (NaNs ignored)"""
+    rows = list(rows)
+    summary = {"count": len(rows)}
+    if not rows:
+        return summary
+    summary["from"] = rows[0][0]
+    summary["to"] = rows[-1][0]
+    for i, name in enumerate(FIELDS[1:], 1):
+        values = [r[i] for r in rows if not math.isnan(r[i])]
+        if values:
+            summary[name] = (min(values), sum(values) / len(values), max(values))
+    return summary
+
+def parse_window(text):
+    """'90s', '30m', '1h', '2d' -> seconds (None if invalid)"""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    text = text.strip().lower()
+    if len(text) < 2 or text[-1] not in units:
+        return None
+    try:
+        return float(text[:-1]) * units[text[-1]]
+    except ValueError:
+        return None
+
+
+class MetricsSampler:
+    """
+    Background thread recording CPU, RAM, disk, battery and network state
+    every `interval` seconds into a MetricsRing persisted at `path`.
+    cpu is psutil's average since the previous sample, not a point value.
+    """
+    def __init__(self, path, interval=60, capacity=1440, disk_path=None):
+        self.path = path
+        self.interval = interval
+        self.disk_path = disk_path or os.path.abspath(os.sep)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_net = None
+
+        self.ring = None
+        if os.path.exists(path):
+            try:
+                self.ring = MetricsRing.load(path, capacity)
+            except Exception as e:
+                print(f"[ERROR] Metrics history unreadable, starting fresh: {e}")
+        if self.ring is None:
+            self.ring = MetricsRing(capacity)
+
+    def sample(self):
+        import psutil
+        now = time.time()
+
+        cpu = psutil.cpu_percent(interval=None)
+        ram = psutil.virtual_memory().percent
+        try:
+            disk = psutil.disk_usage(self.disk_path).percent
+        except Exception:
+            disk = NAN
+
+        battery, plugged = NAN, NAN
+        try:
+            bat = psutil.sensors_battery()
+            if bat is not None:
+                battery = bat.percent
+                plugged = 1.0 if bat.power_plugged else 0.0
+        except Exception:
+            pass
+
+        net_up = 0.0
+        try:
+            for name, stats in psutil.net_if_stats().items():
+                if stats.isup and not name.lower().startswith(("lo", "loopback")):
+                    net_up = 1.0
+                    break
+        except Exception:
+            net_up = NAN
+
+        sent_kbps, recv_kbps = NAN, NAN
+        counters = psutil.net_io_counters()
+        if counters is not None:
+            if self._last_net:
+                last_time, last_sent, last_recv = self._last_net
+                elapsed = max(now - last_time, 1e-6)
+                sent_kbps = (counters.bytes_sent - last_sent) * 8 / 1000 / elapsed
+                recv_kbps = (counters.bytes_recv - last_recv) * 8 / 1000 / elapsed
+            self._last_net = (now, counters.bytes_sent, counters.bytes_recv)
+
+        return (now, cpu, ram, disk, battery, plugged, net_up, sent_kbps, recv_kbps)
+
+    def _loop(self):
+        import psutil
+        # Prime CPU average and network counters; the first row covers
+        # a full interval instead of an instant
+        psutil.cpu_percent(interval=None)
+        counters = psutil.net_io_counters()
+        if counters is not None:
+            self._last_net = (time.time(), counters.bytes_sent, counters.bytes_recv)
+
+        while not self._stop.wait(self.interval):
+            try:
+                row = self.sample()
+                with self._lock:
+                    self.ring.append(row)
+                    self.ring.save(self.path)
+            except Exception as e:
+                print(f"[ERROR] Metrics sample failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self):
+        with self._lock:
+            return self.ring.latest()
+
+    def window(self, seconds):
+        with self._lock:
+            return summarize(self.ring.rows(since=time.time() - seconds))
+
+# --------------------------------------------------
+# REPORT
+# --------------------------------------------------
+def format_window(summary, label):
+    """Telegram Markdown min/avg/max report"""
+    if not summary.get("count"):
+        return f"📈 No metrics recorded in the last {label}."
+
+    def line(icon, title, key, unit):
+        if key not in summary:
+            return f"{icon} *{title}*: N/A"
+        lo, avg, hi = summary[key]
+        return f"{icon} *{title}*: {lo:.0f}/{avg:.0f}/{hi:.0f}{unit}"
+
+    online = summary.get("net_up")
+    online_text = f"{online[1] * 100:.0f}% of samples" if online else "N/A"
+    return (
+        f"📈 *System History ({label}, {summary['count']} samples)*\n"
+        f"------------------------\n"
+        f"_min/avg/max_\n"
+        f"{line('🧠', 'CPU', 'cpu', '%')}\n"
+        f"{line('💾', 'RAM', 'ram', '%')}\n"
+        f"{line('💿', 'Disk', 'disk', '%')}\n"
+        f"{line('⚡', 'Battery', 'battery', '%')}\n"
+        f"{line('📤', 'Net Up', 'net_sent_kbps', ' kbps')}\n"
+        f"{line('📥', 'Net Down', 'net_recv_kbps', ' kbps')}\n"
+        f"🌐 *Online*: {online_text}"
+    )
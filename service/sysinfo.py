@@ -0,0 +1,157 @@
+import sys
+import time
+import platform
+from datetime import datetime
+
+# Filesystems that are never interesting in /stat
+SKIP_FSTYPES = {"", "squashfs", "tmpfs", "devtmpfs", "overlay", "iso9660", "udf"}
+
+CPU_SAMPLE_SECONDS = 0.2  # cpu_percent() window: the load right now, not since the last call
+
+_os_name = None
+
+# --------------------------------------------------
+# PLATFORM HELPERS
+# --------------------------------------------------
+def _os_name_windows():
+    import winreg
+    key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Windows NT\CurrentVersion")
+    try:
+        name = winreg.QueryValueEx(key, "ProductName")[0]
+        try:
+            # ProductName still says "Windows 10" on Windows 11
+            build = int(winreg.QueryValueEx(key, "CurrentBuild")[0])
+            if build >= 22000:
+                name = name.replace("Windows 10", "Windows 11")
+        except Exception:
+            pass
+        return name
+    finally:
+        winreg.CloseKey(key)
+
+def _os_name_linux():
+    with open("/etc/os-release", "r") as f:
+        for line in f:
+            if line.startswith("PRETTY_NAME="):
+                return line.split("=", 1)[1].strip().strip('"')
+    return None
+
+def os_name():
+    """Human readable OS name (cached, it can't change while running)"""
+    global _os_name
+    if _os_name is None:
+        name = None
+        try:
+            if sys.platform == "win32":
+                name = _os_name_windows()
+            elif sys.platform.startswith("linux"):
+                name = _os_name_linux()
+        except Exception:
+            pass
+        _os_name = name or f"{platform.system()} {platform.release()}"
+    return _os_name
+
+def disk_mounts():
+    import psutil
+    mounts = []
+    for part in psutil.disk_partitions(all=False):
+        if part.fstype in SKIP_FSTYPES or "cdrom" in part.opts:
+            continue
+        if part.mountpoint.startswith(("/snap", "/boot/efi")):
+            continue
+        mounts.append(part.mountpoint)
+    return mounts
+
+# --------------------------------------------------
+# COLLECTOR
+# --------------------------------------------------
+def collect(cpu_percent=None):
+    """
+    Gather every /stat metric in-process in a single pass.
+    cpu_percent: a recent reading to use instead of sampling (skips the
+    CPU_SAMPLE_SECONDS wait). Returns a dict; missing metrics are None.
+    """
+    import psutil
+
+    snapshot = {"time": time.time(), "os_name": os_name()}
+
+    try:
+        snapshot["boot_time"] = psutil.boot_time()
+    except Exception:
+        snapshot["boot_time"] = None
+
+    if cpu_percent is None:
+        # interval=None would average over everything since the previous call
+        cpu_percent = psutil.cpu_percent(interval=CPU_SAMPLE_SECONDS)
+    snapshot["cpu_percent"] = cpu_percent
+    try:
+        freq = psutil.cpu_freq()
+        snapshot["cpu_freq_mhz"] = round(freq.current) if freq else None
+    except Exception:
+        snapshot["cpu_freq_mhz"] = None
+
+    mem = psutil.virtual_memory()
+    snapshot["ram_total"] = mem.total
+    snapshot["ram_used"] = mem.total - mem.available
+    snapshot["ram_percent"] = mem.percent
+
+    disks = []
+    for mount in disk_mounts():
+        try:
+            usage = psutil.disk_usage(mount)
+            disks.append({"mount": mount, "total": usage.total, "free": usage.free, "percent": usage.percent})
+        except Exception:
+            continue
+    snapshot["disks"] = disks
+
+    snapshot["battery"] = None
+    try:
+        battery = psutil.sensors_battery()
+        if battery is not None:
+            snapshot["battery"] = {"percent": round(battery.percent), "plugged": battery.power_plugged}
+    except Exception:
+        pass
+
+    return snapshot
+
+# --------------------------------------------------
+# FORMATTING
+# --------------------------------------------------
+def _gb(value):
+    return round(value / (2**30), 1)
+
+def format_report(snapshot):
+    """Telegram Markdown report in the classic /stat layout"""
+    cpu_info = f"{snapshot['cpu_percent']}%"
+    if snapshot.get("cpu_freq_mhz"):
+        cpu_info += f" (Freq: {snapshot['cpu_freq_mhz']}Mhz)"
+
+    ram_info = f"{_gb(snapshot['ram_used'])}GB / {_gb(snapshot['ram_total'])}GB ({snapshot['ram_percent']}%)"
+
+    disk_lines = []
+    for disk in snapshot["disks"]:
+        disk_lines.append(f"💿 *Disk ({disk['mount']})*: {_gb(disk['free'])}GB free / {_gb(disk['total'])}GB")
+    if not disk_lines:
+        disk_lines.append("💿 *Disk*: Unknown")
+
+    battery_info = "N/A (Desktop/No Battery)"
+    battery = snapshot.get("battery")
+    if battery:
+        status_text = "🔌 Plugged In" if battery["plugged"] else "🔋 On Battery"
+        battery_info = f"{battery['percent']}% ({status_text})"
+
+    boot_time = "Unknown"
+    if snapshot.get("boot_time"):
+        boot_time = datetime.fromtimestamp(snapshot["boot_time"]).strftime("%Y-%m-%d %H:%M:%S")
+
+    disk_text = "\n".join(disk_lines)
+    return (
+        f"📊 *System Statistics*\n"
+        f"------------------------\n"
+        f"💻 *System*: {snapshot['os_name']}\n"
+        f"🧠 *CPU*: {cpu_info}\n"
+        f"💾 *RAM*: {ram_info}\n"
+        f"{disk_text}\n"
+        f"⚡ *Battery*: {battery_info}\n"
+        f"⏱️ *Boot Time*: {boot_time}"
+    )
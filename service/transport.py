@@ -0,0 +1,244 @@
+import time
+import threading
+
+try:
+    from connectivity import ConnectivityMonitor
+    from ratelimit import RateLimiter, PRIORITY_REPLY
+    import perf
+except ImportError:
+    from service.connectivity import ConnectivityMonitor
+    from service.ratelimit import RateLimiter, PRIORITY_REPLY
+    import service.perf as perf
+
+API_BASE = "https://api.telegram.org"
+
+# Read timeout per endpoint (seconds). Connect timeout is separate.
+DEFAULT_TIMEOUTS = {
+    "getUpdates": 40,
+    "sendMessage": 10,
+    "sendPhoto": 20,
+    "sendMediaGroup": 60,
+    "sendVideo": 60,
+    "sendDocument": 60,
+    "probe": 2,
+    "default": 15,
+}
+MAX_429_RETRIES = 2  # A 429'd send was not delivered, so retrying is safe
+
+def _rewind(files):
+    """Seek file uploads back to 0 before re-sending a multipart body"""
+    for value in (files or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        if hasattr(f, "seek"):
+            f.seek(0)
+
+def retry_after(resp, default=1.0):
+    """Seconds from a 429 (Bot API parameters.retry_after or Retry-After)"""
+    try:
+        value = resp.json().get("parameters", {}).get("retry_after")
+        if value is not None:
+            return float(value)
+    except Exception:
+        pass
+    try:
+        return float(resp.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+class TelegramTransport:
+    """
+    Shared keep-alive HTTP transport for every Telegram call.
+    One requests.Session with a bounded connection pool, per-endpoint
+    timeouts and a retry policy for connect errors / 5xx responses,
+    so consecutive messages skip the TCP+TLS handshake.
+    requests/urllib3 are imported on first use (or by prewarm()), so
+    building the transport costs nothing at service start.
+    """
+    def __init__(self, bot_token, pool_size=4, retries=2, retry_backoff=0.5, connect_timeout=5, timeouts=None):
+        self.bot_token = bot_token
+        self.pool_size = pool_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.connect_timeout = connect_timeout
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+
+        self._lock = threading.Lock()
+        self._session_lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._network_errors = ()
+        self.counters = {"requests": 0, "errors": 0}
+        self.connectivity = None  # Optional ConnectivityMonitor fed by Telegram requests
+        self.limiter = None  # Optional RateLimiter applied to send* methods
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._build_session()
+        return self._session
+
+    def _build_session(self):
+        with self._session_lock:
+            if self._session is not None:
+                return
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry_args = dict(
+                total=self.retries,
+                connect=self.retries,
+                read=0,  # A read timeout may mean the message went out - don't duplicate
+                status=self.retries,
+                backoff_factor=self.retry_backoff,
+                status_forcelist=(500, 502, 503, 504),
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            )
+            try:
+                retry = Retry(allowed_methods=frozenset(["GET", "POST"]), **retry_args)
+            except TypeError:
+                # urllib3 < 1.26
+                retry = Retry(method_whitelist=frozenset(["GET", "POST"]), **retry_args)
+
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._network_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+            self._session = session
+
+    def prewarm(self, url=API_BASE):
+        """Import the HTTP stack and open a pooled TLS connection ahead of the first alert"""
+        self._build_session()
+        try:
+            self.get(url, endpoint="probe", allow_redirects=False)
+        except Exception:
+            pass  # Offline at boot: the connectivity monitor takes over
+
+    def timeout_for(self, endpoint):
+        read = self.timeouts.get(endpoint, self.timeouts["default"])
+        return (min(self.connect_timeout, read), read)
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def request(self, http_method, url, endpoint="default", timeout=None, **kwargs):
+        """Raw pooled request (used for non-Telegram URLs too)"""
+        session = self.session
+        self._count("requests")
+        # Only Telegram outcomes say whether Telegram is reachable: a
+        # blocked geo-IP service must not park replies in the outbox
+        connectivity = self.connectivity if url.startswith(API_BASE) or endpoint == "probe" else None
+        start = time.perf_counter()
+        try:
+            resp = session.request(
+                http_method, url,
+                timeout=timeout or self.timeout_for(endpoint),
+                **kwargs
+            )
+        except self._network_errors:
+            self._count("errors")
+            perf.incr(f"http_{endpoint}_errors")
+            if connectivity:
+                connectivity.report_failure()
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        perf.observe(f"http_{endpoint}", (time.perf_counter() - start) * 1000)
+        # Any HTTP answer proves the network path works
+        if connectivity:
+            connectivity.report_success()
+        return resp
+
+    def call(self, method, data=None, json=None, files=None, params=None, timeout=None, http_method="POST",
+             priority=PRIORITY_REPLY, cost=1, max_wait=None):
+        """
+        Call a Bot API method, e.g. call("sendMessage", json={...}).
+        send* methods go through the rate limiter: they wait for a slot
+        (by priority; cost = messages, e.g. album size) and a 429 is
+        retried after its retry_after. Raises RateLimited if no slot
+        opens within max_wait seconds.
+        """
+        url = f"{API_BASE}/bot{self.bot_token}/{method}"
+        limiter = self.limiter if method.startswith("send") else None
+        chat = str((json or data or {}).get("chat_id")) if limiter else None
+
+        attempt = 0
+        while True:
+            if limiter:
+                waited = limiter.acquire(chat, priority, cost, max_wait)
+                if waited >= 0.001:
+                    perf.observe("ratelimit_wait", waited * 1000)
+            resp = self.request(
+                http_method, url, endpoint=method, timeout=timeout,
+                data=data, json=json, files=files, params=params
+            )
+            if resp.status_code != 429 or not limiter or attempt >= MAX_429_RETRIES:
+                return resp
+            wait = retry_after(resp)
+            print(f"[NET] {method} throttled by Telegram, retry after {wait:.0f}s")
+            perf.incr("http_429")
+            limiter.penalize(wait, chat)
+            _rewind(files)
+            attempt += 1
+
+    def get(self, url, endpoint="default", timeout=None, **kwargs):
+        return self.request("GET", url, endpoint=endpoint, timeout=timeout, **kwargs)
+
+    def stats(self):
+        """Request counters plus connection reuse from the urllib3 pools"""
+        opened = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools if self._adapter else {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += getattr(pool, "num_connections", 0)
+            pooled_requests += getattr(pool, "num_requests", 0)
+
+        with self._lock:
+            result = dict(self.counters)
+        result["connections_opened"] = opened
+        result["connections_reused"] = max(0, pooled_requests - opened)
+        if self.limiter:
+            result["rate_limit"] = self.limiter.stats()
+        return result
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport(config=None):
+    """Process-wide transport, built from config["network"] on first use"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            if config is None:
+                raise RuntimeError("Transport not initialised")
+            network = config.get("network", {})
+            _transport = TelegramTransport(
+                config.get("telegram", {}).get("bot_token"),
+                pool_size=network.get("pool_size", 4),
+                retries=network.get("retries", 2),
+                retry_backoff=network.get("retry_backoff", 0.5),
+                connect_timeout=network.get("connect_timeout", 5),
+                timeouts=network.get("timeouts"),
+            )
+            probe_url = network.get("probe_url", API_BASE)
+            transport = _transport
+            _transport.connectivity = ConnectivityMonitor(
+                lambda: transport.get(probe_url, endpoint="probe", allow_redirects=False) is not None,
+                min_backoff=network.get("probe_backoff_min", 1),
+                max_backoff=network.get("probe_backoff_max", 60),
+            )
+            _transport.limiter = RateLimiter.from_config(network.get("rate_limit", {}))
+        return _transport
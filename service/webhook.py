@@ -0,0 +1,183 @@
+import json
+import time
+import hmac
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import perf
+except ImportError:
+    import service.perf as perf
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY = 1 << 20  # Updates are a few KB; anything bigger is not Telegram
+RECENT_UPDATES = 512  # update_ids remembered for redelivery checks
+
+def secret_from_token(bot_token):
+    """Default secret_token (Telegram allows A-Z, a-z, 0-9, _ and -)"""
+    return hashlib.sha256(f"watchdog-webhook:{bot_token}".encode()).hexdigest()
+
+# --------------------------------------------------
+# RECEIVER
+# --------------------------------------------------
+class WebhookServer:
+    """
+    Embedded HTTP receiver for Bot API webhook pushes. TLS is terminated
+    by the inbound relay in front of it, so it listens on plain HTTP
+    (loopback by default). Requests without the secret-token header set
+    at setWebhook are rejected; every accepted update is handed to
+    on_update(update) - the same dispatch path as long polling - and
+    acknowledged right away (commands run on the executor, not here).
+    """
+    def __init__(self, host, port, path, secret, on_update):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret.encode()
+        self.on_update = on_update
+        self._recent = OrderedDict()  # update_id -> None, oldest first
+        self.last_received = 0.0
+        self.counters = {"received": 0, "duplicates": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _accept(self, update):
+        """
+        False for a redelivery Telegram retried after a slow 200. With
+        max_connections > 1 updates can arrive out of order, so this is
+        a set of recent ids, not a high-water mark.
+        """
+        update_id = update.get("update_id")
+        with self._lock:
+            self.last_received = time.time()
+            if update_id in self._recent:
+                self.counters["duplicates"] += 1
+                return False
+            if update_id is not None:
+                self._recent[update_id] = None
+                if len(self._recent) > RECENT_UPDATES:
+                    self._recent.popitem(last=False)
+            self.counters["received"] += 1
+        return True
+
+    def _reject(self):
+        with self._lock:
+            self.counters["rejected"] += 1
+
+    def start(self):
+        """Bind (raises OSError if the port is taken) and serve in the background"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Telegram reuses its connections
+            disable_nagle_algorithm = True  # Else the reply waits on a delayed ACK
+
+            def _reply(self, code, body=b"{}"):
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if code != 200:
+                    # The body was not read: don't parse it as the next request
+                    self.send_header("Connection", "close")
+                    self.close_connection = True
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.split("?")[0] != receiver.path:
+                    receiver._reject()
+                    self._reply(404)
+                    return
+                secret = (self.headers.get(SECRET_HEADER) or "").encode()
+                if not hmac.compare_digest(secret, receiver.secret):
+                    receiver._reject()
+                    self._reply(403)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY:
+                    receiver._reject()
+                    self._reply(413 if length else 400)
+                    return
+                start = time.perf_counter()
+                try:
+                    update = json.loads(self.rfile.read(length))
+                    if not isinstance(update, dict):
+                        raise ValueError("update is not an object")
+                except ValueError:
+                    receiver._reject()
+                    self._reply(400)
+                    return
+                if receiver._accept(update):
+                    try:
+                        receiver.on_update(update)
+                    except Exception as e:
+                        # Still 200: a retry would hit the same error
+                        print(f"[ERROR] Webhook update {update.get('update_id')} failed: {e}")
+                perf.observe("webhook_dispatch", (time.perf_counter() - start) * 1000)
+                self._reply(200)
+
+            def do_GET(self):
+                receiver._reject()
+                self._reply(405)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True).start()
+        print(f"[*] Webhook receiver on http://{self.host}:{self.port}{self.path}")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        with self._lock:
+            result = dict(self.counters)
+        result["last_received"] = self.last_received
+        return result
+
+# --------------------------------------------------
+# BOT API REGISTRATION
+# --------------------------------------------------
+def set_webhook(transport, url, secret, max_connections=4):
+    """Register url with Telegram. True on success."""
+    resp = transport.call("setWebhook", json={
+        "url": url,
+        "secret_token": secret,
+        "allowed_updates": ["message"],
+        "max_connections": max_connections,
+    })
+    result = resp.json()
+    if not result.get("ok"):
+        print(f"[ERROR] setWebhook failed: {result.get('description')}")
+    return bool(result.get("ok"))
+
+def delete_webhook(transport):
+    """Back to getUpdates; pending updates are kept for the poller"""
+    try:
+        return bool(transport.call("deleteWebhook", json={"drop_pending_updates": False}).json().get("ok"))
+    except Exception as e:
+        print(f"[ERROR] deleteWebhook failed: {e}")
+        return False
+
+def webhook_info(transport):
+    return transport.call("getWebhookInfo", http_method="GET").json().get("result", {})
+
+def webhook_unreachable(info, registered_at, last_received):
+    """
+    Telegram reported a delivery error since we registered, nothing has
+    reached us since that error, and updates are piling up on its side.
+    """
+    error_at = info.get("last_error_date", 0)
+    return (
+        error_at >= int(registered_at)
+        and error_at > last_received
+        and info.get("pending_update_count", 0) > 0
+    )